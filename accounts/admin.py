@@ -3,6 +3,22 @@ from django.contrib import admin
 from .models import *
 
 admin.site.register(Customer)
-admin.site.register(Product)
-admin.site.register(Order)
 admin.site.register(Tag)
+
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'customer', 'product', 'status', 'date_created')
+    list_filter = ('status',)
+    list_select_related = ('customer', 'product')
+    raw_id_fields = ('customer', 'product')
+
+
+@admin.register(Product)
+class ProductAdmin(admin.ModelAdmin):
+    list_display = ('name', 'category', 'price', 'tag_list')
+    search_fields = ('name',)
+
+    def tag_list(self, product):
+        return ', '.join(product.tag_names)
+    tag_list.short_description = 'tags'
@@ -1,5 +1,38 @@
+import logging
+import os
+
 from django.apps import AppConfig
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
 
 
 class AccountsConfig(AppConfig):
     name = 'accounts'
+
+    def ready(self):
+        from . import checks, receivers  # noqa: F401
+
+
+def preload_templates():
+    """
+    Compile the project's and this app's HTML templates up front so the
+    cached loader never parses on a request. Called by the WSGI and ASGI
+    entry points only; a template that fails to compile is logged and left
+    to fail on the request that uses it.
+    """
+    if not getattr(settings, 'ACCOUNTS_PRELOAD_TEMPLATES', not settings.DEBUG):
+        return
+    from django.template import engines
+    app_templates = os.path.join(os.path.dirname(__file__), 'templates')
+    for engine in engines.all():
+        for directory in list(engine.dirs) + [app_templates]:
+            for root, _, files in os.walk(directory):
+                for name in files:
+                    if not name.endswith('.html'):
+                        continue
+                    template_name = os.path.relpath(os.path.join(root, name), directory)
+                    try:
+                        engine.get_template(template_name)
+                    except Exception:
+                        logger.exception('Could not preload template %s', template_name)
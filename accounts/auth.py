@@ -0,0 +1,99 @@
+"""
+Authenticate requests from a cached snapshot of the user instead of a
+``SELECT`` on ``auth_user`` (and one on the groups) for every request.
+
+The snapshot holds every column of the user but the password hash, the
+session auth hash derived from it and the user's group names. The user is
+rebuilt with the password as a deferred field, so ``save()`` leaves the
+stored hash alone and ``set_password()`` still works. Saving or deleting
+the user, logging out and changing group memberships drop the snapshot;
+renaming or deleting a group orphans all of them through the roles cache
+version. Those invalidations only reach other workers through a shared
+cache, so with a process-local one no snapshots are kept at all.
+"""
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+from . import roles
+from .caching import is_shared
+
+SNAPSHOT_TIMEOUT = getattr(settings, 'ACCOUNTS_USER_SNAPSHOT_TIMEOUT', 300)
+SNAPSHOT_BACKENDS = ('django.contrib.auth.backends.ModelBackend',)
+
+
+def _cache_key(user_id):
+    return 'accounts:user:%s:%s' % (roles.version(), user_id)
+
+
+def _snapshot_fields():
+    return [field.attname for field in get_user_model()._meta.concrete_fields
+            if field.attname != 'password']
+
+
+def snapshot(user):
+    return {
+        'values': [getattr(user, name) for name in _snapshot_fields()],
+        'session_hash': user.get_session_auth_hash(),
+        'roles': roles.get_roles(user),
+    }
+
+
+def from_snapshot(data):
+    user = get_user_model().from_db(DEFAULT_DB_ALIAS, _snapshot_fields(), data['values'])
+    user._cached_roles = data['roles']
+    return user
+
+
+def invalidate_user(user_id):
+    cache.delete(_cache_key(user_id))
+
+
+def get_user(request):
+    """
+    ``django.contrib.auth.get_user()`` served from the snapshot cache. A miss
+    goes through Django's own lookup, which also flushes sessions that no
+    longer match, and stores the result for the next request.
+    """
+    try:
+        user_id = get_user_model()._meta.pk.to_python(request.session[SESSION_KEY])
+        backend_path = request.session[BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+    if (backend_path not in SNAPSHOT_BACKENDS or backend_path not in settings.AUTHENTICATION_BACKENDS
+            or not is_shared()):
+        return auth.get_user(request)
+
+    key = _cache_key(user_id)
+    data = cache.get(key)
+    if data is None:
+        user = auth.get_user(request)
+        if user.is_authenticated:
+            cache.set(key, snapshot(user), SNAPSHOT_TIMEOUT)
+        return user
+
+    user = from_snapshot(data)
+    if not user.is_active:
+        return AnonymousUser()
+    if not constant_time_compare(request.session.get(HASH_SESSION_KEY, ''), data['session_hash']):
+        request.session.flush()
+        return AnonymousUser()
+    user.backend = backend_path
+    return user
+
+
+def _lazy_user(request):
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = get_user(request)
+    return request._cached_user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    def process_request(self, request):
+        request.user = SimpleLazyObject(lambda: _lazy_user(request))
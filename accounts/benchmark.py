@@ -0,0 +1,271 @@
+import math
+import statistics
+import time
+import tracemalloc
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from importlib import import_module
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import Group, User
+from django.db import connections
+from django.middleware.csrf import CSRF_ALLOWED_CHARS, CSRF_TOKEN_LENGTH
+from django.shortcuts import resolve_url
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from .models import Customer, Order, Product
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def summarize(latencies, elapsed, errors=0):
+    """Latencies in seconds in, milliseconds out."""
+    millis = [latency * 1000 for latency in latencies]
+    return {
+        'requests': len(millis),
+        'errors': errors,
+        'rps': round(len(millis) / elapsed, 2) if elapsed else None,
+        'mean_ms': round(statistics.mean(millis), 3) if millis else None,
+        'p50_ms': round(percentile(millis, 50), 3) if millis else None,
+        'p95_ms': round(percentile(millis, 95), 3) if millis else None,
+        'p99_ms': round(percentile(millis, 99), 3) if millis else None,
+    }
+
+
+def session_cookie(user):
+    """A ``Cookie`` header value for a fresh session logged in as ``user``."""
+    session = import_module(settings.SESSION_ENGINE).SessionStore()
+    session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+    return '%s=%s' % (settings.SESSION_COOKIE_NAME, session.session_key)
+
+
+class _NoRedirects(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+_opener = urllib.request.build_opener(_NoRedirects)
+
+
+def is_login_redirect(status, location):
+    return 300 <= status < 400 and urlsplit(location).path == urlsplit(resolve_url(settings.LOGIN_URL)).path
+
+
+def http_load(url, requests, concurrency, cookie=None, method='GET', data=None, headers=None):
+    """
+    Fire ``requests`` requests at ``url`` from ``concurrency`` threads.
+    Redirects are not followed; one to the login page means the server did
+    not accept the session and is counted under ``login_redirects``.
+    """
+    headers = dict(headers or {})
+    if cookie:
+        headers['Cookie'] = cookie
+
+    def fetch(_):
+        start = time.perf_counter()
+        request = urllib.request.Request(url, data=data, headers=headers, method=method)
+        location = ''
+        try:
+            with _opener.open(request) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as error:
+            status, location = error.code, error.headers.get('Location', '')
+            error.close()
+        except (urllib.error.URLError, ConnectionError):
+            status = None
+        return time.perf_counter() - start, status, location
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(fetch, range(requests)))
+    elapsed = time.perf_counter() - start
+    login_redirects = sum(1 for _, status, location in results
+                          if status is not None and is_login_redirect(status, location))
+    ok = [latency for latency, status, location in results
+          if status is not None and status < 400 and not is_login_redirect(status, location)]
+    result = summarize(ok, elapsed, errors=len(results) - len(ok))
+    result['login_redirects'] = login_redirects
+    return result
+
+
+def bench_user():
+    """
+    A staff member of the admin group for the throwaway benchmark database.
+    The client logs in with ``force_login()`` and the server with a forged
+    session, so the account never gets a usable password.
+    """
+    user = User(username='bench-%s' % get_random_string(8), is_staff=True)
+    user.set_unusable_password()
+    user.save()
+    user.groups.add(Group.objects.get_or_create(name='admin')[0])
+    Group.objects.get_or_create(name='customer')
+    return user
+
+
+class Route:
+    """How to exercise one named URL: method, query, body and whether to be logged in."""
+
+    def __init__(self, name, args=(), query=None, method='get', data=None, content_type=None,
+                 anonymous=False, relogin=False):
+        self.name = name
+        self.args = args
+        self.query = query
+        self.method = method
+        self.data = data
+        self.content_type = content_type
+        self.anonymous = anonymous
+        self.relogin = relogin
+
+    def url(self):
+        url = reverse('accounts:%s' % self.name, args=self.args)
+        return '%s?%s' % (url, urlencode(self.query)) if self.query else url
+
+
+def accounts_routes():
+    """Every named route in ``accounts.urls``, pointed at existing rows."""
+    customer = Customer.objects.order_by('id').first()
+    order = Order.objects.order_by('id').first()
+    product = Product.objects.order_by('id').first()
+    import_body = 'product,status\n' + '%d,Pending\n' % product.id * 10
+    term = customer.name.split()[0]
+    # Seeded dates end at SEED_UNTIL, so report the last month of orders rather than of the calendar.
+    latest = Order.objects.order_by('-date_created').values_list('date_created', flat=True).first()
+    report = {'end': timezone.localdate(latest).isoformat(), 'period': 'week', 'by': 'status'}
+    return [
+        Route('home'),
+        Route('login', anonymous=True),
+        Route('logout', relogin=True),
+        Route('register', anonymous=True),
+        Route('products'),
+        Route('customers'),
+        Route('search', query={'q': term}),
+        Route('search_autocomplete', query={'q': term[:3]}),
+        Route('autocomplete', args=['product'], query={'q': product.name[:3]}),
+        Route('reports', query=report),
+        Route('report_data', query=report),
+        Route('metrics'),
+        Route('customer_create'),
+        Route('customer_update', args=[customer.id]),
+        Route('customer_delete', args=[customer.id]),
+        Route('orders', args=[customer.id]),
+        Route('order_export', args=[customer.id]),
+        Route('order_create', args=[customer.id]),
+        Route('order_import', args=[customer.id], method='post', data=import_body,
+              content_type='text/csv'),
+        Route('order_update', args=[order.id]),
+        Route('order_delete', args=[order.id]),
+    ]
+
+
+class QueryTimer:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+def _request(client, route, user):
+    if route.relogin:
+        client.force_login(user)
+    kwargs = {'content_type': route.content_type} if route.content_type else {}
+    args = (route.data,) if route.data is not None else ()
+    response = getattr(client, route.method)(route.url(), *args, **kwargs)
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+def client_bench(route, user, iterations, memory_iterations=3):
+    """
+    Time ``iterations`` requests through the test client, then measure peak
+    Python memory over a few more with tracemalloc (kept out of the timed
+    loop, as tracing slows everything down).
+    """
+    client = Client(raise_request_exception=False)
+    if not route.anonymous:
+        client.force_login(user)
+    _request(client, route, user)
+
+    latencies, statuses = [], {}
+    timer = QueryTimer()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timer))
+        start = time.perf_counter()
+        for _ in range(iterations):
+            began = time.perf_counter()
+            response = _request(client, route, user)
+            latencies.append(time.perf_counter() - began)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        elapsed = time.perf_counter() - start
+
+    peak = 0
+    tracemalloc.start()
+    try:
+        for _ in range(memory_iterations):
+            tracemalloc.reset_peak()
+            _request(client, route, user)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+    finally:
+        tracemalloc.stop()
+
+    result = summarize(latencies, elapsed, errors=sum(n for code, n in statuses.items() if code >= 500))
+    result.update({
+        'statuses': {str(code): n for code, n in sorted(statuses.items())},
+        'queries_per_request': round(timer.count / iterations, 2),
+        'query_ms_per_request': round(timer.seconds * 1000 / iterations, 3),
+        'peak_memory_kb': round(peak / 1024, 1),
+    })
+    return result
+
+
+def server_bench(base_url, route, user, requests, concurrency):
+    if route.relogin:
+        return {'skipped': 'would end the shared benchmark session'}
+    cookies = [] if route.anonymous else [session_cookie(user)]
+    headers = {}
+    if route.method != 'get':
+        token = get_random_string(CSRF_TOKEN_LENGTH, allowed_chars=CSRF_ALLOWED_CHARS)
+        cookies.append('%s=%s' % (settings.CSRF_COOKIE_NAME, token))
+        headers['X-CSRFToken'] = token
+    if route.content_type:
+        headers['Content-Type'] = route.content_type
+    data = route.data.encode() if route.data is not None else None
+    return http_load(base_url.rstrip('/') + route.url(), requests, concurrency, '; '.join(cookies),
+                     method=route.method.upper(), data=data, headers=headers)
+
+
+def compare(baseline, report, metric='p50_ms'):
+    """``{mode: {route: percent change of metric}}`` between two reports."""
+    changes = {}
+    for mode, routes in report.get('results', {}).items():
+        for name, result in routes.items():
+            before = baseline.get('results', {}).get(mode, {}).get(name, {}).get(metric)
+            after = result.get(metric)
+            if before and after is not None:
+                changes.setdefault(mode, {})[name] = round((after - before) / before * 100, 1)
+    return changes
@@ -0,0 +1,87 @@
+import codecs
+import csv
+import json
+from itertools import islice
+
+from django.db import transaction
+
+from .models import Order, Product
+
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+
+
+class OrderImportError(Exception):
+    def __init__(self, errors):
+        super().__init__('%d invalid row(s)' % len(errors))
+        self.errors = errors
+
+
+def read_rows(stream, content_type):
+    """
+    Yield ``(line, row)`` pairs from a CSV (with a header line) or NDJSON
+    byte stream without reading the whole body into memory. A plain JSON
+    array is accepted too, but has to be parsed in one go.
+    """
+    if content_type == 'application/json':
+        rows = json.load(stream)
+        if not isinstance(rows, list):
+            rows = [rows]
+        yield from enumerate(rows, start=1)
+        return
+    lines = codecs.iterdecode(stream, 'utf-8')
+    if content_type in ('application/x-ndjson', 'application/jsonl'):
+        for line, text in enumerate(lines, start=1):
+            if text.strip():
+                try:
+                    yield line, json.loads(text)
+                except ValueError:
+                    yield line, None
+    else:
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+
+
+def import_orders(customer, rows):
+    """
+    Create an order for every row of ``rows`` for ``customer`` in one
+    transaction. Rows are validated a batch at a time against the valid
+    statuses and a single product lookup per batch; if any row is invalid
+    nothing is written and ``OrderImportError`` lists the problems.
+    """
+    statuses = {status for status, _ in Order.STATUS}
+    errors = []
+    created = 0
+    rows = iter(rows)
+    with transaction.atomic():
+        while True:
+            batch = list(islice(rows, IMPORT_BATCH_SIZE))
+            if not batch:
+                break
+            product_ids = set()
+            for _, row in batch:
+                if isinstance(row, dict) and str(row.get('product', '')).isdigit():
+                    product_ids.add(int(row['product']))
+            known = set(Product.objects.filter(pk__in=product_ids).values_list('pk', flat=True))
+            orders = []
+            for line, row in batch:
+                if not isinstance(row, dict):
+                    errors.append({'line': line, 'error': 'Malformed row'})
+                    continue
+                product = str(row.get('product', ''))
+                if not product.isdigit() or int(product) not in known:
+                    errors.append({'line': line, 'error': 'Unknown product %r' % row.get('product')})
+                elif not isinstance(row.get('status'), str) or row['status'] not in statuses:
+                    errors.append({'line': line, 'error': 'Invalid status %r' % row.get('status')})
+                else:
+                    orders.append(Order(customer=customer, product_id=int(product), status=row['status']))
+            if errors:
+                if len(errors) >= MAX_REPORTED_ERRORS:
+                    break
+                continue
+            Order.objects.bulk_create(orders)
+            created += len(orders)
+        if errors:
+            raise OrderImportError(errors[:MAX_REPORTED_ERRORS])
+    return created
@@ -0,0 +1,113 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+
+from .metrics import record_cache
+from .roles import get_roles
+from .versions import bump_version, get_versions  # noqa: F401, re-exported
+
+VIEW_CACHE_TIMEOUT = getattr(settings, 'ACCOUNTS_VIEW_CACHE_TIMEOUT', 60)
+# How long an expired entry may still be served while one worker rebuilds it.
+VIEW_CACHE_STALE_GRACE = getattr(settings, 'ACCOUNTS_VIEW_CACHE_STALE_GRACE', 300)
+VIEW_CACHE_LOCK_TIMEOUT = 30
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+
+def is_shared(alias=DEFAULT_CACHE_ALIAS):
+    """Whether every worker process reads and writes the same entries through this cache."""
+    return not isinstance(caches[alias], PROCESS_LOCAL_CACHES)
+
+
+def cached_value(name, depends_on, compute, timeout=3600):
+    """``compute()``, cached until one of the ``depends_on`` versions is bumped."""
+    key = 'accounts:value:%s:%s' % (name, ':'.join(str(version) for version in get_versions(depends_on)))
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, timeout)
+    return value
+
+
+def normalized_query(request):
+    return sorted((key, sorted(value for value in values if value))
+                  for key, values in request.GET.lists() if any(values))
+
+
+def view_cache_key(request, view_name, depends_on):
+    parts = [view_name, request.user.pk, get_roles(request.user), request.path,
+             normalized_query(request), get_versions(depends_on)]
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return 'accounts:view:%s:%s' % (view_name, digest)
+
+
+def _cached_response(request, depends_on):
+    """
+    ``(key, response, locked)`` for a request to a ``cache_view`` view. The
+    response is None when the view has to run; the key is None when the
+    result must not be cached, and ``locked`` when this worker rebuilds an
+    expired entry.
+    """
+    if (not getattr(settings, 'ACCOUNTS_VIEW_CACHE', True)
+            or request.method not in ('GET', 'HEAD') or not request.user.is_authenticated):
+        return None, None, False
+    view_name = request.resolver_match.view_name if request.resolver_match else request.path
+    key = view_cache_key(request, view_name, depends_on)
+    entry = cache.get(key)
+    locked = False
+    if entry is not None:
+        expires, content, content_type = entry
+        if expires > time.time():
+            record_cache(hit=True)
+            return key, HttpResponse(content, content_type=content_type), False
+        locked = cache.add(key + ':lock', 1, VIEW_CACHE_LOCK_TIMEOUT)
+        if not locked:
+            record_cache(hit=True)
+            return key, HttpResponse(content, content_type=content_type), False
+    record_cache(hit=False)
+    return key, None, locked
+
+
+def _store(key, response, timeout):
+    if hasattr(response, 'render') and callable(response.render):
+        response = response.render()
+    if response.status_code == 200 and not response.streaming and not response.cookies:
+        entry = (time.time() + timeout, response.content, response['Content-Type'])
+        cache.set(key, entry, timeout + VIEW_CACHE_STALE_GRACE)
+    return response
+
+
+def cache_view(depends_on, timeout=None):
+    """
+    Cache a view's response per user, role and normalized query string.
+
+    ``depends_on`` names the versions (see ``bump_version``) baked into the
+    key, so a model change invalidates exactly the views that show it. Once
+    an entry expires, the first worker to notice rebuilds it while the rest
+    keep serving the stale copy for up to ``VIEW_CACHE_STALE_GRACE`` seconds.
+    """
+    timeout = VIEW_CACHE_TIMEOUT if timeout is None else timeout
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper_func(request, *args, **kwargs):
+            key, response, locked = _cached_response(request, depends_on)
+            if response is not None:
+                return response
+            try:
+                response = view_func(request, *args, **kwargs)
+                if key is None:
+                    return response
+                return _store(key, response, timeout)
+            finally:
+                if locked:
+                    cache.delete(key + ':lock')
+
+        return wrapper_func
+
+    return decorator
@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.checks import Error, Tags, Warning, register
+
+from .caching import is_shared
+
+CACHED_SESSION_ENGINES = ('django.contrib.sessions.backends.cache', 'django.contrib.sessions.backends.cached_db')
+
+
+@register(Tags.caches)
+def check_cache_clients(app_configs, **kwargs):
+    """The memcached backends import their client library only when first used."""
+    errors = []
+    for alias in settings.CACHES:
+        try:
+            caches[alias]
+        except ImportError as error:
+            errors.append(Error(
+                'The %r cache cannot be created: %s.' % (alias, error),
+                hint='Install requirements.txt, or set DJANGO_DATABASE=sqlite for a single local process.',
+                id='accounts.E001',
+            ))
+    return errors
+
+
+@register(Tags.caches, Tags.security)
+def check_shared_cache(app_configs, **kwargs):
+    """Sessions kept in a per-process cache outlive a logout in every other worker."""
+    if settings.SESSION_ENGINE not in CACHED_SESSION_ENGINES:
+        return []
+    try:
+        shared = is_shared(settings.SESSION_CACHE_ALIAS)
+    except ImportError:
+        return []  # accounts.E001
+    if not shared:
+        return [Warning(
+            '%s keeps sessions in a process-local cache, so logging out or changing the password '
+            'does not end the session in other worker processes.' % settings.SESSION_ENGINE,
+            hint="Use a shared cache backend or SESSION_ENGINE = 'django.contrib.sessions.backends.db'.",
+            id='accounts.W001',
+        )]
+    return []
@@ -0,0 +1,20 @@
+from django.utils.functional import SimpleLazyObject
+
+from .caching import get_versions
+from .roles import get_role
+
+
+class CacheVersions:
+    """``{{ cache_versions.order }}`` looks the version up only if a template asks for it."""
+
+    def __getitem__(self, name):
+        return get_versions([name])[0]
+
+
+def cache_versions(request):
+    return {'cache_versions': CacheVersions()}
+
+
+def role(request):
+    """``{% if role == 'admin' %}``, the same check the views make with ``allowed_users``."""
+    return {'role': SimpleLazyObject(lambda: get_role(request.user))}
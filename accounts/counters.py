@@ -0,0 +1,81 @@
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import Counter, Customer, Order
+
+ORDERS_TOTAL = 'orders'
+CUSTOMERS_TOTAL = 'customers'
+
+
+def order_status_key(status):
+    if status is None:
+        raise ValueError('Orders without a status have no status counter.')
+    return 'orders:%s' % status
+
+
+def get_counts():
+    return dict(Counter.objects.values_list('name', 'value'))
+
+
+def order_deltas(removed, added):
+    deltas = defaultdict(int)
+    for rows, sign in ((removed, -1), (added, 1)):
+        for row in rows:
+            deltas[ORDERS_TOTAL] += sign
+            if row['status'] is not None:
+                deltas[order_status_key(row['status'])] += sign
+    return deltas
+
+
+def add_to(model, field, delta, **lookup):
+    """
+    Add ``delta`` to ``field`` of the row matching ``lookup``, creating the
+    row if there is none. Of two concurrent creates one fails on the unique
+    constraint and retries as an update.
+    """
+    rows = model.objects.filter(**lookup)
+    if rows.update(**{field: F(field) + delta}):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **{field: delta})
+    except IntegrityError:
+        rows.update(**{field: F(field) + delta})
+
+
+def increment(deltas):
+    for name, delta in deltas.items():
+        if delta:
+            add_to(Counter, 'value', delta, name=name)
+
+
+def actual_counts():
+    counts = {ORDERS_TOTAL: 0, CUSTOMERS_TOTAL: Customer.objects.count()}
+    for status, total in Order.objects.order_by().values_list('status').annotate(Count('id')):
+        counts[ORDERS_TOTAL] += total
+        if status is not None:
+            counts[order_status_key(status)] = total
+    for status, _ in Order.STATUS:
+        counts.setdefault(order_status_key(status), 0)
+    return counts
+
+
+@transaction.atomic
+def reconcile():
+    """Recompute every counter and return ``{name: (stored, actual)}`` for the ones that drifted."""
+    stored = {c.name: c for c in Counter.objects.select_for_update()}
+    actual = actual_counts()
+    drift = {}
+    for name in set(stored) | set(actual):
+        value = actual.get(name, 0)
+        counter = stored.get(name)
+        if counter is None:
+            Counter.objects.create(name=name, value=value)
+            drift[name] = (None, value)
+        elif counter.value != value:
+            drift[name] = (counter.value, value)
+            counter.value = value
+            counter.save(update_fields=['value'])
+    return drift
@@ -1,6 +1,8 @@
 from django.http import HttpResponse
 from django.shortcuts import redirect
 
+from .roles import get_role
+
 
 def unauthenticated_user(view_func):
     def wrapper_func(request, *args, **kwargs):
@@ -15,9 +17,7 @@ def unauthenticated_user(view_func):
 def allowed_users(allowed_roles=None):
     def decorator(view_func):
         def wrapper_func(request, *args, **kwargs):
-            group = None
-            if request.user.groups.exists():
-                group = request.user.groups.all()[0].name
+            group = get_role(request.user)
             if group in allowed_roles:
                 return view_func(request, *args, **kwargs)
             else:
@@ -30,9 +30,7 @@ def allowed_users(allowed_roles=None):
 
 def admin_only(view_func):
     def wrapper_func(request, *args, **kwargs):
-        group = None
-        if request.user.groups.exists():
-            group = request.user.groups.all()[0].name
+        group = get_role(request.user)
         if group == 'customer':
             return redirect('accounts:login')
         if group == 'admin':
@@ -0,0 +1,32 @@
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+EXPORT_CHUNK_SIZE = 2000
+ORDER_EXPORT_FIELDS = ('id', 'product__name', 'product__category', 'status', 'date_created')
+ORDER_EXPORT_HEADER = ('id', 'product', 'category', 'status', 'date_created')
+
+
+class Echo:
+    """File-like object whose ``write`` hands the line back instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows, header):
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(rows, fields):
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(fields, row))) + '\n'
+
+
+def order_rows(queryset):
+    """Plain tuples straight off a server-side cursor, never model instances."""
+    return queryset.values_list(*ORDER_EXPORT_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
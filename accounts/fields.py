@@ -0,0 +1,28 @@
+from django.db import models
+
+
+class SearchVectorField(models.Field):
+    """
+    A ``tsvector`` column on PostgreSQL, filled by ``accounts.search``. Other
+    backends get an unused text column so the schema stays the same.
+    django.contrib.postgres would need psycopg2 even on SQLite.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('null', True)
+        kwargs.setdefault('editable', False)
+        super().__init__(*args, **kwargs)
+
+    def db_type(self, connection):
+        return 'tsvector' if connection.vendor == 'postgresql' else 'text'
+
+
+@SearchVectorField.register_lookup
+class Matches(models.Lookup):
+    """``search_vector__matches='lamp & gard:*'``, a raw ``to_tsquery`` expression."""
+    lookup_name = 'matches'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return "%s @@ to_tsquery('simple', %s)" % (lhs, rhs), lhs_params + rhs_params
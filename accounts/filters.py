@@ -1,9 +1,13 @@
 import django_filters
+from django.urls import reverse_lazy
 from .models import *
-from django_filters import DateFilter
+from .widgets import AutocompleteSelect
+from django_filters import DateFilter, ModelChoiceFilter
 
 
 class OrderFilter(django_filters.FilterSet):
+    product = ModelChoiceFilter(queryset=Product.objects.all(),
+                                widget=AutocompleteSelect(reverse_lazy('accounts:autocomplete', args=['product'])))
     start_date = DateFilter(field_name='date_created', lookup_expr='gte')
     end_date = DateFilter(field_name='date_created', lookup_expr='lte')
 
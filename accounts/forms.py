@@ -1,20 +1,36 @@
+import datetime
+
+from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
-from django.forms import ModelForm, inlineformset_factory
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.forms import BaseInlineFormSet, ModelForm, inlineformset_factory
+from django.urls import reverse_lazy
+from django.utils import timezone
 
-from accounts.models import Order, Customer
+from accounts import rollups
+from accounts.models import Order, Customer, Product
+from accounts.widgets import AutocompleteSelect
 
 
 class CustomerForm(ModelForm):
     class Meta:
         model = Customer
         fields = '__all__'
+        widgets = {
+            'user': AutocompleteSelect(reverse_lazy('accounts:autocomplete', args=['user'])),
+        }
 
 
 class OrderForm(ModelForm):
     class Meta:
         model = Order
         fields = '__all__'
+        widgets = {
+            'customer': AutocompleteSelect(reverse_lazy('accounts:autocomplete', args=['customer'])),
+            'product': AutocompleteSelect(reverse_lazy('accounts:autocomplete', args=['product'])),
+        }
 
 
 class CreateUserForm(UserCreationForm):
@@ -23,10 +39,101 @@ class CreateUserForm(UserCreationForm):
         fields = ['username', 'email', 'password1', 'password2']
 
 
+class ReportForm(forms.Form):
+    """Date range and grouping of a rollup report; anything left out gets the defaults."""
+    DEFAULT_DAYS = 30
+
+    start = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    end = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    period = forms.ChoiceField(choices=[(period, period.title()) for period in rollups.PERIODS], required=False)
+    by = forms.ChoiceField(choices=[(by, by.title()) for by in rollups.DIMENSIONS], required=False)
+    status = forms.ChoiceField(choices=[('', 'Any status')] + list(Order.STATUS), required=False)
+    category = forms.ChoiceField(choices=[('', 'Any category')] + list(Product.CATEGORY), required=False)
+    customer = forms.ModelChoiceField(Customer.objects.all(), required=False, empty_label='Any customer',
+                                      widget=AutocompleteSelect(reverse_lazy('accounts:autocomplete',
+                                                                             args=['customer'])))
+
+    def clean(self):
+        data = super().clean()
+        data['end'] = data.get('end') or timezone.localdate()
+        data['start'] = data.get('start') or data['end'] - datetime.timedelta(days=self.DEFAULT_DAYS - 1)
+        data['period'] = data.get('period') or rollups.PERIODS[0]
+        data['by'] = data.get('by') or ('customer' if data.get('customer') else rollups.DIMENSIONS[0])
+        if data['start'] > data['end']:
+            raise forms.ValidationError('The start date must not be after the end date.')
+        if (data['by'] == 'customer' or data.get('customer')) and \
+                (data['by'] != 'customer' or data.get('status') or data.get('category')):
+            raise forms.ValidationError('Orders per customer are not split by status or category.')
+        return data
+
+
+class BaseOrderFormSet(BaseInlineFormSet):
+    """
+    Works on a bounded window of the customer's orders: the ``recent`` newest
+    ones when rendering, only the posted ids when bound. Unchanged rows skip
+    validation, and the whole formset is saved with one bulk_create, one
+    bulk_update and one DELETE instead of a query per row.
+    """
+
+    def __init__(self, data=None, files=None, instance=None, recent=0, **kwargs):
+        super().__init__(data, files, instance=instance, **kwargs)
+        if self.is_bound:
+            self.queryset = self.queryset.filter(pk__in=self._posted_pks())
+        else:
+            self.queryset = self.queryset.order_by('-date_created', '-id')[:recent]
+
+    def _posted_pks(self):
+        pk = self.model._meta.pk
+        pks = []
+        for i in range(self.initial_form_count()):
+            try:
+                pks.append(pk.to_python(self.data.get('%s-%s' % (self.add_prefix(i), pk.name))))
+            except ValidationError:
+                pass
+        return [value for value in pks if value is not None]
+
+    def _construct_form(self, i, **kwargs):
+        if self.is_bound and i < self.initial_form_count():
+            # Like extra forms, existing rows left untouched are not cleaned.
+            kwargs['empty_permitted'] = True
+        return super()._construct_form(i, **kwargs)
+
+    def save(self, commit=True):
+        if not commit:
+            return super().save(commit=False)
+        self.new_objects, self.changed_objects, self.deleted_objects = [], [], []
+        changed_fields = set()
+        model_fields = {field.name for field in self.model._meta.concrete_fields}
+        for form in self.initial_forms:
+            obj = form.instance
+            if obj.pk is None:
+                continue
+            if self.can_delete and self._should_delete_form(form):
+                self.deleted_objects.append(obj)
+            elif form.has_changed():
+                fields = model_fields.intersection(form.changed_data)
+                self.changed_objects.append((obj, sorted(fields)))
+                changed_fields.update(fields)
+        for form in self.extra_forms:
+            if form.has_changed() and not (self.can_delete and self._should_delete_form(form)):
+                self.new_objects.append(form.instance)
+
+        manager = self.model._default_manager.db_manager(self.instance._state.db)
+        with transaction.atomic(using=manager.db):
+            if self.new_objects:
+                manager.bulk_create(self.new_objects)
+            if changed_fields:
+                manager.bulk_update([obj for obj, _ in self.changed_objects], sorted(changed_fields))
+            if self.deleted_objects:
+                manager.filter(pk__in=[obj.pk for obj in self.deleted_objects]).delete()
+        return self.new_objects + [obj for obj, _ in self.changed_objects]
+
+
 OrderFormSet = inlineformset_factory(
     parent_model=Customer,
     model=Order,
     form=OrderForm,
+    formset=BaseOrderFormSet,
     can_delete=True,
     extra=10,
 )
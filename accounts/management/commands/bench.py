@@ -0,0 +1,102 @@
+import json
+import subprocess
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_test_environment
+from django.utils import timezone
+
+from accounts.benchmark import accounts_routes, bench_user, client_bench, compare, server_bench
+from accounts.seeding import Seeder
+
+
+class Command(BaseCommand):
+    help = ('Benchmark every named route in accounts.urls through the test client and, with --url, '
+            'a running server. Writes a JSON report with throughput, p50/p95/p99 latency, SQL '
+            'query count and time and peak memory per route. By default the dataset is seeded '
+            'into a throwaway test database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=1000)
+        parser.add_argument('--products', type=int, default=100)
+        parser.add_argument('--orders', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--use-existing', action='store_true',
+                            help='Run against the configured database and its data instead.')
+        parser.add_argument('--user', help='Existing username to log in as; required with --use-existing.')
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--url', help='Base URL of a server running on the configured database; '
+                                          'requires --use-existing.')
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument('--route', action='append', dest='routes', help='Only these route names.')
+        parser.add_argument('--output', help='Write the report here instead of stdout.')
+        parser.add_argument('--baseline', help='An earlier report to compare p50 latency against.')
+
+    def handle(self, *args, **options):
+        if options['use_existing'] and not options['user']:
+            raise CommandError('--use-existing needs --user: no account is created outside the test database.')
+        if options['url'] and not options['use_existing']:
+            raise CommandError('--url needs --use-existing: a server cannot see sessions in the test database.')
+        setup_test_environment()
+        settings.ALLOWED_HOSTS = list(settings.ALLOWED_HOSTS) + ['testserver']
+        old_config = None
+        if not options['use_existing']:
+            from django.test.utils import setup_databases
+            old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            if not options['use_existing']:
+                Seeder(seed=options['seed']).run(customers=options['customers'], products=options['products'],
+                                                 orders=options['orders'])
+            report = self.run(options)
+        finally:
+            if old_config is not None:
+                from django.test.utils import teardown_databases
+                teardown_databases(old_config, verbosity=0)
+
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                report['p50_change_percent'] = compare(json.load(baseline), report)
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def run(self, options):
+        if options['use_existing']:
+            try:
+                user = get_user_model().objects.get(username=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError('No user %r' % options['user'])
+        else:
+            user = bench_user()
+        routes = [route for route in accounts_routes()
+                  if not options['routes'] or route.name in options['routes']]
+        results = {'client': {}}
+        for route in routes:
+            results['client'][route.name] = client_bench(route, user, options['iterations'])
+        if options['url']:
+            results['server'] = {}
+            for route in routes:
+                result = server_bench(options['url'], route, user, options['requests'], options['concurrency'])
+                if result.get('login_redirects'):
+                    raise CommandError('%s redirected to the login page: the server did not accept the '
+                                       'benchmark session.' % route.name)
+                results['server'][route.name] = result
+        return {
+            'commit': self.commit(),
+            'created': timezone.now().isoformat(),
+            'dataset': {key: options[key] for key in ('customers', 'products', 'orders', 'seed')}
+            if not options['use_existing'] else 'existing',
+            'results': results,
+        }
+
+    def commit(self):
+        try:
+            return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                  cwd=settings.BASE_DIR).stdout.strip() or None
+        except OSError:
+            return None
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings, setup_test_environment
+
+from accounts.benchmark import Route, client_bench
+from accounts.models import Customer
+
+STOCK_AUTH = 'django.contrib.auth.middleware.AuthenticationMiddleware'
+CACHED_AUTH = 'accounts.auth.CachedAuthenticationMiddleware'
+
+
+class Command(BaseCommand):
+    help = ('Compare queries and latency per request with database sessions and the stock '
+            'AuthenticationMiddleware against the cached sessions and user snapshots in settings.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True, help='Username to log in as.')
+        parser.add_argument('--iterations', type=int, default=50)
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError('No user %r' % options['user'])
+        routes = [Route('home'), Route('products'), Route('reports')]
+        customer = Customer.objects.order_by('id').first()
+        if customer is not None:
+            routes.append(Route('orders', args=[customer.id]))
+
+        setup_test_environment()
+        settings.ALLOWED_HOSTS = list(settings.ALLOWED_HOSTS) + ['testserver']
+        stock_middleware = [STOCK_AUTH if name == CACHED_AUTH else name for name in settings.MIDDLEWARE]
+        configs = (
+            ('before', {'MIDDLEWARE': stock_middleware, 'SESSION_ENGINE': 'django.contrib.sessions.backends.db'}),
+            ('after', {}),
+        )
+        for label, overrides in configs:
+            with override_settings(ACCOUNTS_VIEW_CACHE=False, **overrides):
+                for route in routes:
+                    result = client_bench(route, user, options['iterations'], memory_iterations=0)
+                    self.stdout.write('%-6s %-10s %5.1f queries  p50 %7.2f ms' % (
+                        label, route.name, result['queries_per_request'], result['p50_ms']))
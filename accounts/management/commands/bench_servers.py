@@ -0,0 +1,45 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.benchmark import http_load, session_cookie
+
+
+class Command(BaseCommand):
+    help = ('Compare latency and throughput of running deployments, e.g. '
+            '"gunicorn djangoTutorial.wsgi -w 4 -b :8000" against '
+            '"uvicorn djangoTutorial.asgi:application --workers 4 --port 8001": '
+            'manage.py bench_servers --target wsgi=http://127.0.0.1:8000 '
+            '--target asgi=http://127.0.0.1:8001 --user admin')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', required=True, metavar='NAME=URL')
+        parser.add_argument('--path', action='append', dest='paths', metavar='PATH')
+        parser.add_argument('--user', help='Username to send the requests as.')
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=20)
+
+    def handle(self, *args, **options):
+        targets = []
+        for target in options['target']:
+            name, sep, url = target.partition('=')
+            if not sep:
+                raise CommandError('--target must look like NAME=URL')
+            targets.append((name, url.rstrip('/')))
+        cookie = None
+        if options['user']:
+            try:
+                cookie = session_cookie(get_user_model().objects.get(username=options['user']))
+            except get_user_model().DoesNotExist:
+                raise CommandError('No user %r' % options['user'])
+        report = {}
+        for name, base in targets:
+            report[name] = {}
+            for path in options['paths'] or ['/', '/products/']:
+                result = http_load(base + path, options['requests'], options['concurrency'], cookie)
+                if result['login_redirects']:
+                    raise CommandError('%s%s redirected to the login page: the server did not accept the '
+                                       'session.' % (base, path))
+                report[name][path] = result
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,59 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment
+from django.urls import reverse
+
+from accounts.caching import bump_version
+from accounts.models import Customer
+
+PLAIN_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+CACHED_LOADERS = [('django.template.loaders.cached.Loader', PLAIN_LOADERS)]
+
+
+class Command(BaseCommand):
+    help = ('Time the dashboard, customer and product pages with the plain template loaders and '
+            'no fragment cache, then with the cached loader and warm fragments. The per-user '
+            'view cache is off for both runs so the templates are rendered every time.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True, help='Username to log in as.')
+        parser.add_argument('--iterations', type=int, default=50)
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError('No user %r' % options['user'])
+        customer = Customer.objects.order_by('id').first()
+        urls = [reverse('accounts:home'), reverse('accounts:products')]
+        if customer is not None:
+            urls.append(reverse('accounts:orders', args=[customer.id]))
+
+        setup_test_environment()
+        settings.ALLOWED_HOSTS = list(settings.ALLOWED_HOSTS) + ['testserver']
+        client = Client()
+        client.force_login(user)
+        for label, loaders, warm in (('before', PLAIN_LOADERS, False), ('after', CACHED_LOADERS, True)):
+            templates = [dict(settings.TEMPLATES[0], OPTIONS=dict(settings.TEMPLATES[0]['OPTIONS'],
+                                                                  loaders=loaders))]
+            with override_settings(TEMPLATES=templates, ACCOUNTS_VIEW_CACHE=False):
+                for url in urls:
+                    client.get(url)
+                    timings = []
+                    for _ in range(options['iterations']):
+                        if not warm:
+                            for name in ('order', 'customer', 'product'):
+                                bump_version(name)
+                        start = time.perf_counter()
+                        client.get(url)
+                        timings.append((time.perf_counter() - start) * 1000)
+                    self.stdout.write('%-6s %-12s mean %7.2f ms  p50 %7.2f ms' % (
+                        label, url, statistics.mean(timings), statistics.median(timings)))
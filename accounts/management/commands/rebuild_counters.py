@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from accounts import counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute the dashboard counters from the order and customer tables.'
+
+    def handle(self, *args, **options):
+        drift = counters.reconcile()
+        for name, (stored, actual) in sorted(drift.items()):
+            self.stdout.write('%s: %s -> %s' % (name, stored, actual))
+        self.stdout.write(self.style.SUCCESS('%d counter(s) corrected.' % len(drift)))
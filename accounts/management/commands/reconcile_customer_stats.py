@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from accounts import stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-customer order statistics from the order table and repair any drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('customers', nargs='*', type=int, help='Only these customer ids.')
+
+    def handle(self, *args, **options):
+        drift = stats.reconcile(options['customers'] or None)
+        for customer_id, (stored, actual) in sorted(drift.items()):
+            self.stdout.write('%s: %s -> %s' % (customer_id, stored, actual))
+        self.stdout.write(self.style.SUCCESS('%d customer(s) corrected.' % len(drift)))
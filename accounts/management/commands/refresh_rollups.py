@@ -0,0 +1,30 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import rollups
+
+
+class Command(BaseCommand):
+    help = ('Recompute the order rollups of the days marked dirty, of the given --day(s), '
+            'or with --all of every day.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--day', action='append', dest='days', metavar='YYYY-MM-DD')
+        parser.add_argument('--all', action='store_true', help='Rebuild every bucket from scratch.')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            rollups.rebuild()
+            self.stdout.write(self.style.SUCCESS('Rebuilt all order rollups.'))
+            return
+        days = None
+        if options['days']:
+            try:
+                days = [datetime.date.fromisoformat(day) for day in options['days']]
+            except ValueError as error:
+                raise CommandError(error)
+        refreshed = rollups.refresh(days)
+        for day in refreshed:
+            self.stdout.write(day.isoformat())
+        self.stdout.write(self.style.SUCCESS('%d day(s) refreshed.' % len(refreshed)))
@@ -0,0 +1,36 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.seeding import SEED_UNTIL, Seeder
+
+
+class Command(BaseCommand):
+    help = ('Load deterministic synthetic customers, products, tags, orders and users. The same '
+            '--seed gives the same data. Rows go through PostgreSQL COPY when available.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=1000)
+        parser.add_argument('--products', type=int, default=100)
+        parser.add_argument('--orders', type=int, default=10000)
+        parser.add_argument('--tags', type=int, default=15)
+        parser.add_argument('--users', type=int, default=0,
+                            help='Customer accounts to create, linked to the first customers.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--days', type=int, default=730, help='How far back dates go.')
+        parser.add_argument('--until', type=datetime.date.fromisoformat, default=SEED_UNTIL.date(),
+                            help='Day the dates count back from (default %s).' % SEED_UNTIL.date())
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--no-copy', action='store_true', help='Use INSERT statements even on PostgreSQL.')
+
+    def handle(self, *args, **options):
+        if options['orders'] and not (options['customers'] and options['products']):
+            raise CommandError('Orders need at least one new customer and product.')
+        start = time.perf_counter()
+        until = datetime.datetime.combine(options['until'], datetime.time(), tzinfo=datetime.timezone.utc)
+        seeder = Seeder(seed=options['seed'], days=options['days'], until=until, batch_size=options['batch_size'],
+                        use_copy=not options['no_copy'], log=self.stdout.write)
+        seeder.run(customers=options['customers'], products=options['products'], orders=options['orders'],
+                   tags=options['tags'], users=options['users'])
+        self.stdout.write(self.style.SUCCESS('Done in %.1fs.' % (time.perf_counter() - start)))
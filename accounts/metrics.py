@@ -0,0 +1,259 @@
+"""
+Where the time goes in a request.
+
+``MetricsMiddleware`` counts SQL queries and their time through an
+execute wrapper on every database connection, template render time
+through the ``TimedDjangoTemplates`` backend and view cache hits and
+misses reported by ``caching.cache_view``. All three find the request
+through a context variable, which ``sync_to_async`` carries into its
+worker threads, so requests served under ASGI are counted too. Each response gets a
+``Server-Timing`` header with the totals. Everything is also added to
+per-process histograms and counters labelled by URL name, which
+``render()`` writes out in the Prometheus text format together with the
+connection pool and throttle statistics.
+
+Scrapers get in with ``Authorization: Bearer <ACCOUNTS_METRICS_TOKEN>`` or
+from an address in ``ACCOUNTS_METRICS_ALLOWED_IPS``; anyone else has to
+be logged in as staff.
+"""
+import ipaddress
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates, Template
+from django.utils.crypto import constant_time_compare
+
+from djangoTutorial.db.pool import all_stats
+from . import throttle
+
+BUCKETS = tuple(getattr(settings, 'ACCOUNTS_METRICS_BUCKETS',
+                        (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)))
+UNMATCHED = 'unmatched'
+SCRAPE_TOKEN = getattr(settings, 'ACCOUNTS_METRICS_TOKEN', '')
+SCRAPE_NETWORKS = [ipaddress.ip_network(network, strict=False)
+                   for network in getattr(settings, 'ACCOUNTS_METRICS_ALLOWED_IPS', ())]
+
+_current = ContextVar('request_metrics', default=None)
+_lock = threading.Lock()
+_views = {}
+
+
+class RequestMetrics:
+    __slots__ = ('queries', 'db_seconds', 'template_seconds', 'rendering', 'cache_hits', 'cache_misses', 'lock')
+
+    def __init__(self):
+        self.queries = self.cache_hits = self.cache_misses = 0
+        self.db_seconds = self.template_seconds = 0.0
+        self.rendering = False
+        # Queries of one request can run in several threads at once.
+        self.lock = threading.Lock()
+
+    def add_query(self, seconds):
+        with self.lock:
+            self.queries += 1
+            self.db_seconds += seconds
+
+    def server_timing(self, seconds):
+        return ', '.join([
+            'db;dur=%.1f;desc="%d queries"' % (self.db_seconds * 1000, self.queries),
+            'tpl;dur=%.1f' % (self.template_seconds * 1000),
+            'cache;desc="hits=%d misses=%d"' % (self.cache_hits, self.cache_misses),
+            'total;dur=%.1f' % (seconds * 1000),
+        ])
+
+
+class ViewMetrics:
+    __slots__ = ('buckets', 'seconds', 'count', 'statuses', 'queries', 'db_seconds', 'template_seconds',
+                 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.statuses = {}
+        self.count = self.queries = self.cache_hits = self.cache_misses = 0
+        self.seconds = self.db_seconds = self.template_seconds = 0.0
+
+    def observe(self, status, seconds, metrics):
+        for index, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[index] += 1
+                break
+        self.count += 1
+        self.seconds += seconds
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.queries += metrics.queries
+        self.db_seconds += metrics.db_seconds
+        self.template_seconds += metrics.template_seconds
+        self.cache_hits += metrics.cache_hits
+        self.cache_misses += metrics.cache_misses
+
+
+def observe(view, status, seconds, metrics):
+    with _lock:
+        view_metrics = _views.get(view)
+        if view_metrics is None:
+            view_metrics = _views[view] = ViewMetrics()
+        view_metrics.observe(status, seconds, metrics)
+
+
+def _time_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(time.perf_counter() - start)
+
+
+def install(connection):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _time_query)
+
+
+@receiver(connection_created)
+def time_queries(sender, connection, **kwargs):
+    install(connection)
+
+
+def record_cache(hit):
+    metrics = _current.get()
+    if metrics is not None:
+        with metrics.lock:
+            if hit:
+                metrics.cache_hits += 1
+            else:
+                metrics.cache_misses += 1
+
+
+def reset():
+    with _lock:
+        _views.clear()
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None or metrics.rendering:
+            return super().render(context, request)
+        metrics.rendering = True
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_seconds += time.perf_counter() - start
+            metrics.rendering = False
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing each top-level render for ``MetricsMiddleware``."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # Connections opened before this module was imported missed connection_created.
+        for connection in connections.all():
+            install(connection)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        seconds = time.perf_counter() - start
+        match = request.resolver_match
+        observe(match.view_name if match else UNMATCHED, response.status_code, seconds, metrics)
+        response['Server-Timing'] = metrics.server_timing(seconds)
+        return response
+
+
+def scraper_allowed(request):
+    """Whether ``request`` carries the scrape token or comes from an allowed address."""
+    if SCRAPE_TOKEN:
+        scheme, _, token = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+        if scheme.lower() == 'bearer' and constant_time_compare(token.strip(), SCRAPE_TOKEN):
+            return True
+    if SCRAPE_NETWORKS:
+        try:
+            address = ipaddress.ip_address(throttle.client_ip(request))
+        except ValueError:
+            return False
+        return any(address in network for network in SCRAPE_NETWORKS)
+    return False
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{%s}' % ','.join('%s="%s"' % (name, _label(value)) for name, value in labels.items())
+
+
+def render():
+    """Every metric of this process in the Prometheus text exposition format."""
+    with _lock:
+        views = sorted((view, {name: getattr(metrics, name) for name in ViewMetrics.__slots__})
+                       for view, metrics in _views.items())
+        for _, snapshot in views:
+            snapshot['buckets'] = list(snapshot['buckets'])
+            snapshot['statuses'] = dict(snapshot['statuses'])
+
+    lines = ['# HELP django_request_duration_seconds Time spent in the middleware stack per URL name.',
+             '# TYPE django_request_duration_seconds histogram']
+    for view, snapshot in views:
+        cumulative = 0
+        for bound, count in zip(BUCKETS, snapshot['buckets']):
+            cumulative += count
+            lines.append('django_request_duration_seconds_bucket%s %d' % (_labels(view=view, le=bound), cumulative))
+        lines.append('django_request_duration_seconds_bucket%s %d' % (_labels(view=view, le='+Inf'),
+                                                                     snapshot['count']))
+        lines.append('django_request_duration_seconds_sum%s %f' % (_labels(view=view), snapshot['seconds']))
+        lines.append('django_request_duration_seconds_count%s %d' % (_labels(view=view), snapshot['count']))
+
+    lines += ['# HELP django_responses_total Responses per URL name and status code.',
+              '# TYPE django_responses_total counter']
+    for view, snapshot in views:
+        for status, count in sorted(snapshot['statuses'].items()):
+            lines.append('django_responses_total%s %d' % (_labels(view=view, status=status), count))
+
+    for name, key, kind, help_text in (
+            ('django_db_queries_total', 'queries', '%d', 'SQL queries executed.'),
+            ('django_db_duration_seconds_total', 'db_seconds', '%f', 'Time spent executing SQL.'),
+            ('django_template_duration_seconds_total', 'template_seconds', '%f', 'Time spent rendering templates.'),
+            ('accounts_view_cache_hits_total', 'cache_hits', '%d', 'Responses served from the view cache.'),
+            ('accounts_view_cache_misses_total', 'cache_misses', '%d', 'View cache lookups that rendered the view.')):
+        lines += ['# HELP %s %s' % (name, help_text), '# TYPE %s counter' % name]
+        for view, snapshot in views:
+            lines.append(('%s%s ' + kind) % (name, _labels(view=view), snapshot[key]))
+
+    pools = all_stats()
+    for key, kind in (('size', 'gauge'), ('idle', 'gauge'), ('in_use', 'gauge'), ('max_size', 'gauge'),
+                      ('checkouts', 'counter'), ('waits', 'counter'), ('timeouts', 'counter'),
+                      ('errors', 'counter'), ('created', 'counter'), ('closed', 'counter'),
+                      ('ping_failures', 'counter'), ('wait_seconds', 'counter')):
+        name = 'django_db_pool_%s%s' % (key, '_total' if kind == 'counter' else '')
+        lines.append('# TYPE %s %s' % (name, kind))
+        for alias, stats in sorted(pools.items()):
+            lines.append('%s%s %s' % (name, _labels(alias=alias), stats.get(key, 0)))
+
+    lines += ['# HELP accounts_throttle_requests_total Credential requests by endpoint and outcome.',
+              '# TYPE accounts_throttle_requests_total counter']
+    for (endpoint, outcome), count in sorted(throttle.stats().items()):
+        lines.append('accounts_throttle_requests_total%s %d' % (_labels(endpoint=endpoint, outcome=outcome), count))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,33 @@
+# Generated by Django 3.1.14 on 2026-10-18 16:42
+
+from django.db import migrations, models
+
+
+def populate_counters(apps, schema_editor):
+    Counter = apps.get_model('accounts', 'Counter')
+    Customer = apps.get_model('accounts', 'Customer')
+    Order = apps.get_model('accounts', 'Order')
+    counters = [Counter(name='customers', value=Customer.objects.count()),
+                Counter(name='orders', value=Order.objects.count())]
+    for status in ('Pending', 'Out for delivery', 'Delivered'):
+        counters.append(Counter(name='orders:%s' % status, value=Order.objects.filter(status=status).count()))
+    Counter.objects.bulk_create(counters)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0019_auto_20210225_1755'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Counter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
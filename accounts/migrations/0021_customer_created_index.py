@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-18 16:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0020_counter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['-date_created', '-id'], name='customer_created_idx'),
+        ),
+    ]
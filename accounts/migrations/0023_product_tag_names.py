@@ -0,0 +1,44 @@
+# Generated by Django 3.1.14 on 2026-10-18 17:30
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def populate_tag_names(apps, schema_editor):
+    Product = apps.get_model('accounts', 'Product')
+    names = defaultdict(list)
+    links = (Product.tags.through.objects.exclude(tag__name=None)
+             .order_by('tag__name').values_list('product_id', 'tag__name'))
+    for product_id, name in links:
+        names[product_id].append(name)
+    Product.objects.bulk_update([Product(pk=pk, tag_names=tags) for pk, tags in names.items()],
+                                ['tag_names'], batch_size=1000)
+
+
+def create_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE INDEX product_tag_names_gin ON accounts_product '
+                              'USING gin (tag_names jsonb_path_ops)')
+
+
+def drop_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS product_tag_names_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0022_order_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='tag_names',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.RunPython(populate_tag_names, migrations.RunPython.noop),
+        migrations.RunPython(create_gin_index, drop_gin_index),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 3.1.14 on 2026-10-18 16:59
+
+import accounts.fields
+from django.db import migrations
+
+CUSTOMER_VECTOR = ("setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+                   "setweight(to_tsvector('simple', coalesce(email, '')), 'B') || "
+                   "setweight(to_tsvector('simple', coalesce(phone, '')), 'C')")
+PRODUCT_VECTOR = ("setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+                  "setweight(to_tsvector('simple', coalesce(tag_names::text, '')), 'B') || "
+                  "setweight(to_tsvector('simple', coalesce(description, '')), 'C')")
+INDEXES = (
+    ('customer_search_idx', 'accounts_customer USING gin (search_vector)'),
+    ('product_search_idx', 'accounts_product USING gin (search_vector)'),
+    ('customer_name_prefix_idx', 'accounts_customer (UPPER(name::text) text_pattern_ops)'),
+    ('product_name_prefix_idx', 'accounts_product (UPPER(name::text) text_pattern_ops)'),
+    ('customer_name_trgm_idx', 'accounts_customer USING gin (UPPER(name::text) gin_trgm_ops)'),
+    ('customer_email_trgm_idx', 'accounts_customer USING gin (UPPER(email::text) gin_trgm_ops)'),
+    ('customer_phone_trgm_idx', 'accounts_customer USING gin (UPPER(phone::text) gin_trgm_ops)'),
+    ('product_name_trgm_idx', 'accounts_product USING gin (UPPER(name::text) gin_trgm_ops)'),
+)
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute('UPDATE accounts_customer SET search_vector = ' + CUSTOMER_VECTOR)
+    schema_editor.execute('UPDATE accounts_product SET search_vector = ' + PRODUCT_VECTOR)
+    for name, definition in INDEXES:
+        schema_editor.execute('CREATE INDEX %s ON %s' % (name, definition))
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in INDEXES:
+        schema_editor.execute('DROP INDEX IF EXISTS %s' % name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0023_product_tag_names'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='search_vector',
+            field=accounts.fields.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=accounts.fields.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 3.1.14 on 2026-10-18 17:04
+
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def populate_rollups(apps, schema_editor):
+    Order = apps.get_model('accounts', 'Order')
+    OrderRollup = apps.get_model('accounts', 'OrderRollup')
+    counts = defaultdict(int)
+    rows = (Order.objects.annotate(day=TruncDate('date_created')).order_by()
+            .values_list('day', 'status', 'product__category').annotate(count=Count('id')))
+    for day, status, category, count in rows:
+        counts[day, status or '', category or ''] += count
+    OrderRollup.objects.bulk_create(
+        (OrderRollup(day=day, status=status, category=category, count=count)
+         for (day, status, category), count in counts.items()),
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0024_search_vectors'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(blank=True, max_length=50)),
+                ('category', models.CharField(blank=True, max_length=200)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupDirtyDay',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='orderrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'status', 'category'), name='order_rollup_bucket'),
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
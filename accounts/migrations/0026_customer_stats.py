@@ -0,0 +1,53 @@
+# Generated by Django 3.1.14 on 2026-10-18 17:06
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def populate_customer_stats(apps, schema_editor):
+    Customer = apps.get_model('accounts', 'Customer')
+    CustomerStats = apps.get_model('accounts', 'CustomerStats')
+    Order = apps.get_model('accounts', 'Order')
+    totals = {row['customer_id']: row for row in
+              Order.objects.exclude(customer=None).order_by().values('customer_id')
+              .annotate(order_count=Count('id'),
+                        delivered=Count('id', filter=Q(status='Delivered')),
+                        pending=Count('id', filter=Q(status='Pending')),
+                        total_spent=Coalesce(Sum('product__price'), 0.0),
+                        last_order_at=Max('date_created'))}
+    CustomerStats.objects.bulk_create(
+        (CustomerStats(**totals.get(customer_id, {'customer_id': customer_id}))
+         for customer_id in Customer.objects.values_list('id', flat=True).iterator()),
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0025_order_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerStats',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='accounts.customer')),
+                ('order_count', models.IntegerField(default=0)),
+                ('delivered', models.IntegerField(default=0)),
+                ('pending', models.IntegerField(default=0)),
+                ('total_spent', models.FloatField(default=0)),
+                ('last_order_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='customerstats',
+            index=models.Index(fields=['-order_count', '-customer'], name='customer_stats_orders_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customerstats',
+            index=models.Index(fields=['-total_spent', '-customer'], name='customer_stats_spent_idx'),
+        ),
+        migrations.RunPython(populate_customer_stats, migrations.RunPython.noop),
+    ]
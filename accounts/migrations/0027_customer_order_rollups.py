@@ -0,0 +1,44 @@
+# Generated by Django 3.1.14 on 2026-10-18 18:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def populate_rollups(apps, schema_editor):
+    Order = apps.get_model('accounts', 'Order')
+    CustomerOrderRollup = apps.get_model('accounts', 'CustomerOrderRollup')
+    rows = (Order.objects.exclude(customer=None).annotate(day=TruncDate('date_created')).order_by()
+            .values_list('day', 'customer_id').annotate(count=Count('id')))
+    CustomerOrderRollup.objects.bulk_create(
+        (CustomerOrderRollup(day=day, customer_id=customer_id, count=count) for day, customer_id, count in rows),
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0026_customer_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerOrderRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('count', models.BigIntegerField(default=0)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='accounts.customer')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='customerorderrollup',
+            index=models.Index(fields=['day'], name='customer_order_rollup_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='customerorderrollup',
+            constraint=models.UniqueConstraint(fields=('customer', 'day'), name='customer_order_rollup_bucket'),
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,38 @@
+from collections import defaultdict
+
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import IntegrityError, connections, models, router, transaction
+
+from .fields import SearchVectorField
+from .signals import customers_created, orders_changed, bulk_operation
+
+ORDER_TRACKED_FIELDS = ('id', 'customer_id', 'product_id', 'status', 'date_created')
+ORDER_TRACKED_NAMES = set(ORDER_TRACKED_FIELDS) | {'customer', 'product'}
+
+
+class CustomerQuerySet(models.QuerySet):
+    def bulk_create(self, objs, batch_size=None, ignore_conflicts=False):
+        """
+        Send ``customers_created`` with the ids of exactly the rows inserted.
+        Only PostgreSQL returns them from a multi-row insert, and not when
+        conflicts are ignored; otherwise the customers are saved one by one
+        and ``post_save`` does the bookkeeping instead.
+        """
+        db = self._db or router.db_for_write(self.model)
+        objs = list(objs)
+        if connections[db].features.can_return_rows_from_bulk_insert and not ignore_conflicts:
+            objs = super().bulk_create(objs, batch_size=batch_size)
+            customers_created.send(sender=self.model, customer_ids=[obj.pk for obj in objs])
+            return objs
+        with transaction.atomic(using=db, savepoint=False):
+            for obj in objs:
+                try:
+                    with transaction.atomic(using=db):
+                        obj.save(force_insert=True, using=db)
+                except IntegrityError:
+                    if not ignore_conflicts:
+                        raise
+        return objs
 
 
 class Customer(models.Model):
@@ -8,10 +41,18 @@ class Customer(models.Model):
     phone = models.CharField(max_length=50, null=True)
     email = models.EmailField(max_length=100, null=True)
     date_created = models.DateTimeField(auto_now_add=True)
+    search_vector = SearchVectorField()
+
+    objects = CustomerQuerySet.as_manager()
 
     def __str__(self):
         return self.name
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-date_created', '-id'], name='customer_created_idx'),
+        ]
+
 
 class Tag(models.Model):
     name = models.CharField(max_length=100, null=True)
@@ -20,6 +61,47 @@ class Tag(models.Model):
         return self.name
 
 
+class ProductQuerySet(models.QuerySet):
+    """
+    ``tag_names`` mirrors ``tags`` so that tag filters and facet counts skip
+    the through table. It is GIN-indexed on PostgreSQL only, so other
+    backends keep joining.
+    """
+
+    def _use_tag_names(self):
+        return connections[self.db].vendor == 'postgresql'
+
+    def with_tag(self, name):
+        if self._use_tag_names():
+            return self.filter(tag_names__contains=[name])
+        return self.filter(tags__name=name)
+
+    def tag_facets(self):
+        """``[(tag name, product count)]`` over this queryset, most common first."""
+        if self._use_tag_names():
+            sql, params = self.order_by().values('tag_names').query.sql_with_params()
+            with connections[self.db].cursor() as cursor:
+                cursor.execute('SELECT tag, COUNT(*) FROM (%s) product, jsonb_array_elements_text(product.tag_names) tag '
+                               'GROUP BY tag ORDER BY 2 DESC, 1' % sql, params)
+                return cursor.fetchall()
+        return list(Tag.objects.using(self.db)
+                    .filter(product__in=self.order_by().values('pk'))
+                    .values_list('name')
+                    .annotate(count=models.Count('product'))
+                    .order_by('-count', 'name'))
+
+    def refresh_tag_names(self):
+        """Rebuild ``tag_names`` of these products from the through table."""
+        names = defaultdict(list)
+        links = (self.model.tags.through.objects.using(self.db)
+                 .filter(product__in=self.order_by().values('pk')).exclude(tag__name=None)
+                 .order_by('tag__name').values_list('product_id', 'tag__name'))
+        for product_id, name in links:
+            names[product_id].append(name)
+        products = [self.model(pk=pk, tag_names=names[pk]) for pk in self.values_list('pk', flat=True)]
+        self.model._base_manager.using(self.db).bulk_update(products, ['tag_names'], batch_size=1000)
+
+
 class Product(models.Model):
     CATEGORY = (
         ('Indoor', 'Indoor'),
@@ -30,7 +112,11 @@ class Product(models.Model):
     category = models.CharField(max_length=200, null=True, choices=CATEGORY)
     description = models.CharField(max_length=200, null=True, blank=True)
     tags = models.ManyToManyField(Tag)
+    tag_names = models.JSONField(default=list, blank=True, editable=False)
     date_created = models.DateTimeField(auto_now_add=True)
+    search_vector = SearchVectorField()
+
+    objects = ProductQuerySet.as_manager()
 
     def __str__(self):
         return self.name
@@ -39,6 +125,54 @@ class Product(models.Model):
         permissions = [
             ('list_all_products', 'allow to view all product list'),
         ]
+        indexes = [
+            models.Index(fields=['-date_created', '-id'], name='product_created_idx'),
+        ]
+
+
+class OrderQuerySet(models.QuerySet):
+    """
+    Bulk operations bypass the model signals, so they report what they
+    changed through ``orders_changed`` in one batch instead. ``bulk_update``
+    is covered too, as it goes through ``update``.
+    """
+
+    def update(self, **kwargs):
+        if not ORDER_TRACKED_NAMES.intersection(kwargs):
+            return super().update(**kwargs)
+        removed = list(self._on_write_db().values(*ORDER_TRACKED_FIELDS))
+        rows = super().update(**kwargs)
+        added = list(self.model._base_manager.using(self.db)
+                     .filter(pk__in=[row['id'] for row in removed])
+                     .values(*ORDER_TRACKED_FIELDS))
+        orders_changed.send(sender=self.model, removed=removed, added=added)
+        return rows
+
+    def _on_write_db(self):
+        return self.using(self._db or router.db_for_write(self.model, **self._hints))
+
+    def delete(self):
+        removed = list(self._on_write_db().values(*ORDER_TRACKED_FIELDS))
+        with bulk_operation():
+            result = super().delete()
+        orders_changed.send(sender=self.model, removed=removed, added=[])
+        return result
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        orders_changed.send(sender=self.model, removed=[],
+                            added=[obj.tracked_state() for obj in objs])
+        return objs
+
+
+class OrderManager(models.Manager.from_queryset(OrderQuerySet)):
+    """Every listing shows the customer and product, so join them up front."""
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('customer', 'product')
 
 
 class Order(models.Model):
@@ -52,5 +186,110 @@ class Order(models.Model):
     status = models.CharField(max_length=50, null=True, choices=STATUS)
     date_created = models.DateTimeField(auto_now_add=True)
 
+    objects = OrderManager()
+
+    class Meta:
+        # One per access path: the dashboard's latest orders, a customer's
+        # filtered history (CustomerDetail/OrderFilter) and status listings.
+        indexes = [
+            models.Index(fields=['-date_created', '-id'], name='order_created_idx'),
+            models.Index(fields=['customer', '-date_created', '-id'], name='order_customer_created_idx'),
+            models.Index(fields=['status', '-date_created'], name='order_status_created_idx'),
+            models.Index(fields=['-date_created'], condition=models.Q(status='Pending'),
+                         name='order_pending_idx'),
+        ]
+
     def __str__(self):
         return '%s, %s, %s' % (self.customer, self.product.name, self.status)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_state = {name: value for name, value in zip(field_names, values)
+                                  if name in ORDER_TRACKED_FIELDS}
+        return instance
+
+    def tracked_state(self):
+        return {name: getattr(self, name) for name in ORDER_TRACKED_FIELDS}
+
+    def loaded_state(self):
+        """
+        The tracked fields as they were last read from or written to the
+        primary; an instance read from a replica is looked up again.
+        """
+        state = getattr(self, '_loaded_state', None)
+        db = router.db_for_write(type(self), instance=self)
+        if state is None or len(state) != len(ORDER_TRACKED_FIELDS) or self._state.db != db:
+            state = (type(self)._base_manager.using(db).filter(pk=self.pk)
+                     .values(*ORDER_TRACKED_FIELDS).first())
+        return state
+
+
+class Counter(models.Model):
+    """Running totals kept current by ``accounts.receivers``, see ``accounts.counters``."""
+    name = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return '%s: %s' % (self.name, self.value)
+
+
+class OrderRollup(models.Model):
+    """Orders per day, status and product category, see ``accounts.rollups``."""
+    day = models.DateField()
+    status = models.CharField(max_length=50, blank=True)
+    category = models.CharField(max_length=200, blank=True)
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'status', 'category'], name='order_rollup_bucket'),
+        ]
+
+    def __str__(self):
+        return '%s %s %s: %s' % (self.day, self.status, self.category, self.count)
+
+
+class CustomerOrderRollup(models.Model):
+    """Orders per day and customer, see ``accounts.rollups``."""
+    day = models.DateField()
+    customer = models.ForeignKey(Customer, related_name='+', on_delete=models.CASCADE)
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['customer', 'day'], name='customer_order_rollup_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['day'], name='customer_order_rollup_day_idx'),
+        ]
+
+    def __str__(self):
+        return '%s %s: %s' % (self.day, self.customer_id, self.count)
+
+
+class RollupDirtyDay(models.Model):
+    """A day whose ``OrderRollup`` rows must be recomputed by ``refresh_rollups``."""
+    day = models.DateField(unique=True)
+
+    def __str__(self):
+        return str(self.day)
+
+
+class CustomerStats(models.Model):
+    """A customer's order totals kept current by ``accounts.receivers``, see ``accounts.stats``."""
+    customer = models.OneToOneField(Customer, primary_key=True, related_name='stats', on_delete=models.CASCADE)
+    order_count = models.IntegerField(default=0)
+    delivered = models.IntegerField(default=0)
+    pending = models.IntegerField(default=0)
+    total_spent = models.FloatField(default=0)
+    last_order_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-order_count', '-customer'], name='customer_stats_orders_idx'),
+            models.Index(fields=['-total_spent', '-customer'], name='customer_stats_spent_idx'),
+        ]
+
+    def __str__(self):
+        return '%s: %s orders' % (self.customer_id, self.order_count)
@@ -0,0 +1,189 @@
+import base64
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+from django.db.models.constants import LOOKUP_SEP
+from django.http import Http404
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(values, reverse=False):
+    data = {'k': [value.isoformat() if isinstance(value, datetime.datetime) else value
+                  for value in values]}
+    if reverse:
+        data['r'] = 1
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, fields=None):
+    """
+    Return ``(values, reverse)`` for a token made by ``encode_cursor``. With
+    ``fields`` (see ``ordering_fields``) every value is converted by its
+    field, so a tampered cursor is a 404 rather than an error in the query.
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        values = data['k']
+    except (ValueError, TypeError, KeyError):
+        raise Http404('Invalid cursor')
+    if not isinstance(values, list) or any(value is None or isinstance(value, (list, dict))
+                                           for value in values):
+        raise Http404('Invalid cursor')
+    if fields is None:
+        values = [parse_datetime(value) or value if isinstance(value, str) else value
+                  for value in values]
+    else:
+        if len(values) != len(fields):
+            raise Http404('Invalid cursor')
+        try:
+            values = [field.to_python(value) for field, value in zip(fields, values)]
+        except (ValidationError, ValueError, TypeError):
+            raise Http404('Invalid cursor')
+        if None in values:
+            raise Http404('Invalid cursor')
+    return values, bool(data.get('r'))
+
+
+def ordering_fields(queryset, ordering):
+    """The model field or annotation output field behind each name in ``ordering``."""
+    fields = []
+    for name in ordering:
+        name = name.lstrip('-')
+        if name in queryset.query.annotations:
+            fields.append(queryset.query.annotations[name].output_field)
+            continue
+        opts = queryset.model._meta
+        *path, last = name.split(LOOKUP_SEP)
+        for part in path:
+            opts = opts.get_field(part).related_model._meta
+        fields.append(opts.pk if last == 'pk' else opts.get_field(last))
+    return fields
+
+
+def keyset_filter(ordering, values):
+    """
+    Rows strictly after ``values`` in ``ordering``, e.g. for ('-date_created', '-id'):
+    date_created < d OR (date_created = d AND id < i).
+    """
+    condition = Q()
+    for i, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        clause = Q(**{'%s__%s' % (name, lookup): values[i]})
+        for previous, value in zip(ordering[:i], values[:i]):
+            clause &= Q(**{previous.lstrip('-'): value})
+        condition |= clause
+    return condition
+
+
+def flip(ordering):
+    return tuple(field[1:] if field.startswith('-') else '-' + field for field in ordering)
+
+
+class KeysetPage:
+    def __init__(self, object_list, ordering, has_next, has_previous):
+        self.object_list = object_list
+        self.ordering = ordering
+        self.has_next_page = has_next
+        self.has_previous_page = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.has_next_page
+
+    def has_previous(self):
+        return self.has_previous_page
+
+    def has_other_pages(self):
+        return self.has_next_page or self.has_previous_page
+
+    def _cursor(self, row, reverse):
+        return encode_cursor([getattr(row, field.lstrip('-')) for field in self.ordering], reverse)
+
+    @property
+    def next_cursor(self):
+        if self.has_next_page and self.object_list:
+            return self._cursor(self.object_list[-1], reverse=False)
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous_page and self.object_list:
+            return self._cursor(self.object_list[0], reverse=True)
+
+
+def keyset_page(queryset, ordering, cursor=None, size=20):
+    """Return the ``size`` rows next to ``cursor`` without counting or OFFSET."""
+    reverse = False
+    if cursor:
+        values, reverse = decode_cursor(cursor, ordering_fields(queryset, ordering))
+        walk = flip(ordering) if reverse else ordering
+        queryset = queryset.order_by(*walk).filter(keyset_filter(walk, values))
+    else:
+        queryset = queryset.order_by(*ordering)
+    rows = list(queryset[:size + 1])
+    more = len(rows) > size
+    rows = rows[:size]
+    if reverse:
+        rows.reverse()
+        return KeysetPage(rows, ordering, has_next=True, has_previous=more)
+    return KeysetPage(rows, ordering, has_next=more, has_previous=bool(cursor))
+
+
+def estimate_count(queryset):
+    """
+    The planner's row estimate for ``queryset`` on PostgreSQL, None elsewhere.
+    Cheap enough to show as "about N" where an exact COUNT(*) is not.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    # psycopg2 decodes the json column; other drivers may hand back the text.
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']['Plan Rows']
+
+
+def cursor_page(request, queryset, ordering, size, param='cursor', estimate=False):
+    """
+    ``keyset_page`` driven by the request's ``param``. The page gets
+    ``next_query``/``previous_query``/``first_query`` (the current query
+    string with the cursor swapped) so filter parameters survive paging.
+    """
+    page = keyset_page(queryset, ordering, cursor=request.GET.get(param), size=size)
+
+    def query(cursor):
+        params = request.GET.copy()
+        params.pop(param, None)
+        if cursor:
+            params[param] = cursor
+        return params.urlencode()
+
+    page.next_query = query(page.next_cursor)
+    page.previous_query = query(page.previous_cursor)
+    page.first_query = query(None)
+    page.estimated_total = estimate_count(queryset) if estimate else None
+    return page
+
+
+class CursorPaginationMixin:
+    """Drop-in replacement for ``MultipleObjectMixin`` paging, see ``cursor_page``."""
+    cursor_ordering = ('-date_created', '-id')
+    cursor_query_param = 'cursor'
+    estimate_total = False
+
+    def paginate_queryset(self, queryset, page_size):
+        page = cursor_page(self.request, queryset, self.cursor_ordering, page_size,
+                           param=self.cursor_query_param, estimate=self.estimate_total)
+        return None, page, page.object_list, page.has_other_pages()
@@ -0,0 +1,209 @@
+from django.contrib.auth.models import Group, User
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import auth, counters, rollups, roles, search, stats
+from .caching import bump_version
+from .models import Customer, CustomerStats, Order, Product, Tag
+from .routers import primary
+from .signals import customers_created, in_bulk_operation, orders_changed
+
+
+@receiver(pre_save, sender=Order)
+def order_saving(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._previous_state = None if instance._state.adding else instance.loaded_state()
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = None if created else instance._previous_state
+    current = instance.tracked_state()
+    instance._loaded_state = dict(current)
+    if previous != current:
+        orders_changed.send(sender=sender, removed=[previous] if previous else [], added=[current])
+
+
+@receiver(pre_delete, sender=Order)
+def order_deleting(sender, instance, **kwargs):
+    if not in_bulk_operation():
+        instance._deleted_state = instance.loaded_state()
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    if in_bulk_operation():
+        return
+    state = getattr(instance, '_deleted_state', None) or instance.tracked_state()
+    orders_changed.send(sender=sender, removed=[state], added=[])
+
+
+@receiver(orders_changed)
+def update_order_counters(sender, removed=(), added=(), **kwargs):
+    counters.increment(counters.order_deltas(removed, added))
+
+
+@receiver(orders_changed)
+def update_order_rollups(sender, removed=(), added=(), **kwargs):
+    rollups.increment(rollups.bucket_deltas(removed, added))
+    rollups.increment_customers(rollups.customer_deltas(removed, added))
+
+
+@receiver(orders_changed)
+def update_customer_stats(sender, removed=(), added=(), **kwargs):
+    stats.apply(*stats.customer_deltas(removed, added))
+
+
+def product_customers(product):
+    return list(primary(Order.objects.filter(product=product)).order_by()
+                .values_list('customer_id', flat=True).distinct())
+
+
+@receiver(pre_save, sender=Product)
+def product_saving(sender, instance, raw=False, **kwargs):
+    if not raw and instance.pk is not None:
+        instance._previous_values = (primary(Product.objects.filter(pk=instance.pk))
+                                     .values_list('category', 'price').first())
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, raw=False, **kwargs):
+    previous = getattr(instance, '_previous_values', None)
+    if created or raw or previous is None:
+        return
+    category, price = previous
+    if category != instance.category:
+        # Its orders keep their buckets until refresh_rollups recomputes those days.
+        rollups.mark_dirty(rollups.order_days(primary(Order.objects.filter(product=instance))))
+    if price != instance.price:
+        stats.reconcile(product_customers(instance))
+
+
+@receiver(pre_delete, sender=Product)
+def product_deleting(sender, instance, **kwargs):
+    rollups.mark_dirty(rollups.order_days(primary(Order.objects.filter(product=instance))))
+    instance._customer_ids = product_customers(instance)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    stats.reconcile(instance._customer_ids)
+
+
+@receiver(post_save, sender=Customer)
+def customer_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.increment({counters.CUSTOMERS_TOTAL: 1})
+        CustomerStats.objects.bulk_create([CustomerStats(customer=instance)], ignore_conflicts=True)
+
+
+@receiver(customers_created)
+def customers_bulk_created(sender, customer_ids, **kwargs):
+    if customer_ids:
+        counters.increment({counters.CUSTOMERS_TOTAL: len(customer_ids)})
+        CustomerStats.objects.bulk_create([CustomerStats(customer_id=customer_id) for customer_id in customer_ids],
+                                          ignore_conflicts=True)
+        search.update_vectors(Customer.objects.filter(pk__in=customer_ids))
+        bump_version('customer')
+
+
+@receiver(post_delete, sender=Customer)
+def customer_deleted(sender, instance, **kwargs):
+    counters.increment({counters.CUSTOMERS_TOTAL: -1})
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        roles.invalidate_user(instance.pk)
+        auth.invalidate_user(instance.pk)
+    elif pk_set:
+        for user_id in pk_set:
+            roles.invalidate_user(user_id)
+            auth.invalidate_user(user_id)
+    else:
+        roles.invalidate_all()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    auth.invalidate_user(instance.pk)
+
+
+@receiver(user_logged_out)
+def logged_out(sender, request, user, **kwargs):
+    if user is not None:
+        auth.invalidate_user(user.pk)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, **kwargs):
+    roles.invalidate_all()
+
+
+@receiver(orders_changed)
+def invalidate_order_views(sender, **kwargs):
+    bump_version('order')
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def invalidate_customer_views(sender, **kwargs):
+    bump_version('customer')
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(m2m_changed, sender=Product.tags.through)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_product_views(sender, **kwargs):
+    bump_version('product')
+
+
+def refresh_tags(products):
+    products.refresh_tag_names()
+    search.update_vectors(products)
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def sync_product_tag_names(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            refresh_tags(Product.objects.filter(pk=instance.pk))
+    elif action == 'pre_clear':
+        instance._cleared_product_ids = list(instance.product_set.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        refresh_tags(Product.objects.filter(pk__in=pk_set))
+    elif action == 'post_clear':
+        refresh_tags(Product.objects.filter(pk__in=instance._cleared_product_ids))
+
+
+@receiver(post_save, sender=Tag)
+def tag_renamed(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        refresh_tags(Product.objects.filter(tags=instance))
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleting(sender, instance, **kwargs):
+    instance._product_ids = list(instance.product_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    refresh_tags(Product.objects.filter(pk__in=instance._product_ids))
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Product)
+def update_search_vector(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.update_vectors(sender.objects.filter(pk=instance.pk))
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .versions import bump_version, get_versions
+
+ROLE_CACHE_TIMEOUT = getattr(settings, 'ACCOUNTS_ROLE_CACHE_TIMEOUT', 300)
+
+
+def version():
+    """Moves on every group rename or deletion, see ``invalidate_all``."""
+    return get_versions(['roles'])[0]
+
+
+def _cache_key(user_id):
+    return 'accounts:roles:%s:%s' % (version(), user_id)
+
+
+def get_roles(user):
+    """
+    Names of the user's groups, in the order ``user.groups.all()`` returns
+    them. Remembered on the user object for the rest of the request and in
+    the shared cache until a membership change or group rename.
+    """
+    if not user.is_authenticated:
+        return ()
+    roles = getattr(user, '_cached_roles', None)
+    if roles is None:
+        key = _cache_key(user.pk)
+        roles = cache.get(key)
+        if roles is None:
+            roles = tuple(user.groups.values_list('name', flat=True))
+            cache.set(key, roles, ROLE_CACHE_TIMEOUT)
+        user._cached_roles = roles
+    return roles
+
+
+def get_role(user):
+    roles = get_roles(user)
+    return roles[0] if roles else None
+
+
+def invalidate_user(user_id):
+    cache.delete(_cache_key(user_id))
+
+
+def invalidate_all():
+    """Orphan every cached entry at once by moving to a new key version."""
+    bump_version('roles')
@@ -0,0 +1,144 @@
+"""
+Order counts per (day, status, product category) and per (day, customer),
+kept current from ``orders_changed`` so reports never scan ``Order``. Days
+are local dates in the current time zone.
+
+Changes that move orders between buckets without an order event, such as
+a product changing category or being deleted, mark the affected days
+dirty. ``refresh()`` then recomputes just those days.
+"""
+import datetime
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate, TruncWeek
+from django.utils import timezone
+
+from .counters import add_to
+from .models import CustomerOrderRollup, Order, OrderRollup, Product, RollupDirtyDay
+from .routers import primary
+
+PERIODS = ('day', 'week')
+DIMENSIONS = ('status', 'category', 'customer')
+
+
+def local_day(value):
+    return timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+
+
+def bucket_deltas(removed, added):
+    product_ids = {row['product_id'] for rows in (removed, added) for row in rows if row['product_id']}
+    categories = (dict(primary(Product.objects.filter(pk__in=product_ids)).values_list('pk', 'category'))
+                  if product_ids else {})
+    deltas = defaultdict(int)
+    for rows, sign in ((removed, -1), (added, 1)):
+        for row in rows:
+            bucket = (local_day(row['date_created']), row['status'] or '', categories.get(row['product_id']) or '')
+            deltas[bucket] += sign
+    return deltas
+
+
+def increment(deltas):
+    for (day, status, category), delta in deltas.items():
+        if delta:
+            add_to(OrderRollup, 'count', delta, day=day, status=status, category=category)
+
+
+def customer_deltas(removed, added):
+    deltas = defaultdict(int)
+    for rows, sign in ((removed, -1), (added, 1)):
+        for row in rows:
+            if row['customer_id']:
+                deltas[local_day(row['date_created']), row['customer_id']] += sign
+    return deltas
+
+
+def increment_customers(deltas):
+    for (day, customer_id), delta in deltas.items():
+        if delta:
+            add_to(CustomerOrderRollup, 'count', delta, day=day, customer_id=customer_id)
+
+
+def order_days(orders):
+    return list(orders.dates('date_created', 'day'))
+
+
+def mark_dirty(days):
+    RollupDirtyDay.objects.bulk_create((RollupDirtyDay(day=day) for day in set(days)), ignore_conflicts=True)
+
+
+def _day_range(day):
+    start = timezone.make_aware(datetime.datetime.combine(day, datetime.time()))
+    return start, timezone.make_aware(datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time()))
+
+
+def _recompute(orders):
+    counts = defaultdict(int)
+    rows = (orders.annotate(day=TruncDate('date_created')).order_by()
+            .values_list('day', 'status', 'product__category').annotate(count=Count('id')))
+    for day, status, category, count in rows:
+        counts[day, status or '', category or ''] += count
+    return [OrderRollup(day=day, status=status, category=category, count=count)
+            for (day, status, category), count in counts.items()]
+
+
+def _recompute_customers(orders):
+    rows = (orders.exclude(customer=None).annotate(day=TruncDate('date_created')).order_by()
+            .values_list('day', 'customer_id').annotate(count=Count('id')))
+    return [CustomerOrderRollup(day=day, customer_id=customer_id, count=count) for day, customer_id, count in rows]
+
+
+@transaction.atomic
+def refresh(days=None, batch_size=50):
+    """Recompute the given days, by default the dirty ones, and return them."""
+    dirty = RollupDirtyDay.objects.select_for_update()
+    if days is None:
+        days = dirty.values_list('day', flat=True)
+    days = sorted(set(days))
+    for start in range(0, len(days), batch_size):
+        chunk = days[start:start + batch_size]
+        ranges = Q()
+        for day in chunk:
+            first, last = _day_range(day)
+            ranges |= Q(date_created__gte=first, date_created__lt=last)
+        orders = Order._base_manager.filter(ranges)
+        OrderRollup.objects.filter(day__in=chunk).delete()
+        OrderRollup.objects.bulk_create(_recompute(orders), batch_size=1000)
+        CustomerOrderRollup.objects.filter(day__in=chunk).delete()
+        CustomerOrderRollup.objects.bulk_create(_recompute_customers(orders), batch_size=1000)
+        dirty.filter(day__in=chunk).delete()
+    return days
+
+
+@transaction.atomic
+def rebuild():
+    """Recompute every bucket from scratch, e.g. after a bulk load."""
+    OrderRollup.objects.all().delete()
+    OrderRollup.objects.bulk_create(_recompute(Order._base_manager.all()), batch_size=1000)
+    CustomerOrderRollup.objects.all().delete()
+    CustomerOrderRollup.objects.bulk_create(_recompute_customers(Order._base_manager.all()), batch_size=1000)
+    RollupDirtyDay.objects.all().delete()
+
+
+def series(start, end, period='day', by='status', status=None, category=None, customer=None):
+    """
+    ``[{'period': date, <by>: value, 'count': n}]`` for ``start <= day <= end``,
+    optionally for one status or category. Weeks start on Monday. By customer,
+    the value is the customer's id and each row has their ``name`` too; those
+    counts can be narrowed to one customer but not to a status or category.
+    """
+    bucket = F('day') if period == 'day' else TruncWeek('day')
+    if by == 'customer':
+        rollups = CustomerOrderRollup.objects.filter(day__gte=start, day__lte=end)
+        if customer:
+            rollups = rollups.filter(customer=customer)
+        return list(rollups.annotate(period=bucket).values('period', 'customer')
+                    .annotate(name=F('customer__name'), count=Sum('count')).order_by('period', 'customer'))
+    rollups = OrderRollup.objects.filter(day__gte=start, day__lte=end)
+    if status:
+        rollups = rollups.filter(status=status)
+    if category:
+        rollups = rollups.filter(category=category)
+    return list(rollups.annotate(period=bucket).values('period', by)
+                .annotate(count=Sum('count')).order_by('period', by))
@@ -0,0 +1,119 @@
+"""
+Send reads to replicas and writes to ``default``.
+
+POST and other unsafe requests read from the primary throughout, and a
+request that writes is pinned to the primary for the rest of the request
+and, through a short-lived cookie set by ``ReplicaPinningMiddleware``, for
+the next ``ACCOUNTS_REPLICA_PIN_SECONDS`` so the user reads their own
+writes. Reads that counters, rollups and stats are derived from go through
+``primary()`` wherever they run.
+
+A replica's health is checked at most every
+``ACCOUNTS_REPLICA_CHECK_SECONDS``. One that cannot be connected to, or
+whose queries fail with a connection error, is skipped for
+``ACCOUNTS_REPLICA_RETRY_SECONDS`` and reads fall back to the primary when
+none is left.
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, InterfaceError, OperationalError, connections, router
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+PIN_COOKIE = 'pin_primary'
+PIN_SECONDS = getattr(settings, 'ACCOUNTS_REPLICA_PIN_SECONDS', 5)
+RETRY_SECONDS = getattr(settings, 'ACCOUNTS_REPLICA_RETRY_SECONDS', 30)
+CHECK_SECONDS = getattr(settings, 'ACCOUNTS_REPLICA_CHECK_SECONDS', 5)
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+_request_state = ContextVar('replica_request_state', default=None)
+_unavailable_until = {}
+_healthy_until = {}
+
+
+def mark_unavailable(alias):
+    _healthy_until.pop(alias, None)
+    _unavailable_until[alias] = time.monotonic() + RETRY_SECONDS
+
+
+def replica_available(alias):
+    now = time.monotonic()
+    if _unavailable_until.get(alias, 0) > now:
+        return False
+    if _healthy_until.get(alias, 0) > now:
+        return True
+    try:
+        connections[alias].ensure_connection()
+    except OperationalError:
+        mark_unavailable(alias)
+        return False
+    _unavailable_until.pop(alias, None)
+    _healthy_until[alias] = now + CHECK_SECONDS
+    return True
+
+
+def _watch_replica(execute, sql, params, many, context):
+    try:
+        return execute(sql, params, many, context)
+    except (OperationalError, InterfaceError):
+        mark_unavailable(context['connection'].alias)
+        raise
+
+
+@receiver(connection_created)
+def watch_replica_queries(sender, connection, **kwargs):
+    if (connection.alias in getattr(settings, 'DATABASE_REPLICAS', ())
+            and _watch_replica not in connection.execute_wrappers):
+        connection.execute_wrappers.insert(0, _watch_replica)
+
+
+def primary(queryset):
+    """``queryset`` read from the write alias, so replica lag cannot skew what is derived from it."""
+    return queryset.using(router.db_for_write(queryset.model))
+
+
+def reset():
+    _unavailable_until.clear()
+    _healthy_until.clear()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        if (state and state['pinned']) or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        replicas = [alias for alias in getattr(settings, 'DATABASE_REPLICAS', ())
+                    if replica_available(alias)]
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state['pinned'] = state['wrote'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in getattr(settings, 'DATABASE_REPLICAS', ())
+
+
+class ReplicaPinningMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = {'pinned': PIN_COOKIE in request.COOKIES or request.method not in SAFE_METHODS,
+                 'wrote': False}
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        if state['wrote']:
+            response.set_cookie(PIN_COOKIE, '1', max_age=PIN_SECONDS, httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,93 @@
+"""
+Search over customers, products (including tag names) and their orders.
+
+On PostgreSQL, ``search_vector`` columns with GIN indexes answer ranked
+full-text queries. Word prefixes match, so "ann smi" finds "Anna Smith".
+``autocomplete`` matches name prefixes through an ``UPPER(name)``
+pattern-ops index. Trigram indexes cover the ``icontains`` filters used
+elsewhere. Other backends fall back to ``icontains`` with a simple
+name-based rank.
+"""
+import re
+from functools import reduce
+from operator import and_, or_
+
+from django.db import connections, router
+from django.db.models import Case, FloatField, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import Customer, Order, Product
+
+VECTOR_SQL = {
+    Customer: ("setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+               "setweight(to_tsvector('simple', coalesce(email, '')), 'B') || "
+               "setweight(to_tsvector('simple', coalesce(phone, '')), 'C')"),
+    Product: ("setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+              "setweight(to_tsvector('simple', coalesce(tag_names::text, '')), 'B') || "
+              "setweight(to_tsvector('simple', coalesce(description, '')), 'C')"),
+}
+FALLBACK_FIELDS = {
+    Customer: ('name', 'email', 'phone'),
+    Product: ('name', 'description', 'tags__name'),
+}
+AUTOCOMPLETE_MIN_LENGTH = 2
+
+
+def indexed(model, using=None):
+    return connections[using or router.db_for_read(model)].vendor == 'postgresql'
+
+
+def prefix_tsquery(text):
+    """``'Ann smi'`` -> ``'ann:* & smi:*'``, or None when there is nothing to search for."""
+    words = re.findall(r'\w+', text.lower())
+    return ' & '.join('%s:*' % word for word in words) or None
+
+
+def update_vectors(queryset):
+    """Recompute ``search_vector`` for these rows; a no-op without PostgreSQL."""
+    if indexed(queryset.model, queryset.db):
+        queryset.update(search_vector=RawSQL(VECTOR_SQL[queryset.model], []))
+
+
+def search(model, text):
+    """``Customer`` or ``Product`` rows matching ``text``, best match first."""
+    queryset = model.objects.all()
+    tsquery = prefix_tsquery(text)
+    if tsquery is None:
+        return queryset.none()
+    if indexed(model):
+        rank = RawSQL("ts_rank(%s.search_vector, to_tsquery('simple', %%s))" % model._meta.db_table,
+                      [tsquery], output_field=FloatField())
+        return queryset.filter(search_vector__matches=tsquery).annotate(rank=rank).order_by('-rank', '-id')
+    words = re.findall(r'\w+', text)
+    matches = reduce(and_, (reduce(or_, (Q(**{'%s__icontains' % field: word}) for field in FALLBACK_FIELDS[model]))
+                            for word in words))
+    rank = Case(When(name__istartswith=text.strip(), then=Value(2)),
+                When(name__icontains=text.strip(), then=Value(1)),
+                default=Value(0), output_field=IntegerField())
+    return queryset.filter(matches).distinct().annotate(rank=rank).order_by('-rank', '-id')
+
+
+def search_orders(text):
+    """Orders of the matching customers or for the matching products, newest first."""
+    return Order.objects.filter(
+        Q(customer__in=search(Customer, text).order_by().values('pk'))
+        | Q(product__in=search(Product, text).order_by().values('pk'))
+    ).order_by('-date_created', '-id')
+
+
+def autocomplete(model, text, limit=10):
+    """
+    ``[(pk, name)]`` whose name starts with ``text``, topped up on PostgreSQL
+    with rows where any word does. Both are index lookups bounded by ``limit``,
+    so the cost does not grow with the table.
+    """
+    text = text.strip()
+    if len(text) < AUTOCOMPLETE_MIN_LENGTH:
+        return []
+    found = list(model.objects.filter(name__istartswith=text).order_by().values_list('pk', 'name')[:limit])
+    tsquery = prefix_tsquery(text)
+    if len(found) < limit and tsquery and indexed(model):
+        found += model.objects.filter(search_vector__matches=tsquery).exclude(
+            pk__in=[pk for pk, _ in found]).order_by().values_list('pk', 'name')[:limit - len(found)]
+    return found
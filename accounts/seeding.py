@@ -0,0 +1,207 @@
+"""
+Deterministic synthetic data at production-like volumes for benchmarks
+and for reproducing scale problems, see ``manage.py seed``.
+
+Rows go in through the cursor, with PostgreSQL ``COPY`` when available
+and batched ``INSERT`` statements otherwise. Both bypass the model
+signals, so the derived tables are reconciled and the cache versions
+bumped once at the end instead of row by row. Dates count back from
+``SEED_UNTIL`` rather than from now, so a seed gives the same rows on
+every run.
+"""
+import bisect
+import csv
+import datetime
+import io
+import itertools
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.db import connections, router, transaction
+
+from . import counters, rollups, search, stats
+from .caching import bump_version
+from .models import Customer, Order, Product, Tag
+
+FIRST_NAMES = ('Anna', 'Bram', 'Chen', 'Daan', 'Emma', 'Fatima', 'Goran', 'Hana', 'Ivan', 'Julia',
+               'Kenji', 'Lotte', 'Milan', 'Noor', 'Omar', 'Priya', 'Quinn', 'Ruben', 'Sara', 'Tom')
+LAST_NAMES = ('de Vries', 'Jansen', 'Bakker', 'Visser', 'Smit', 'Meijer', 'Mulder', 'Bos', 'Vos',
+              'Peters', 'Hendriks', 'Dekker', 'Brouwer', 'de Wit', 'Dijkstra', 'Kok', 'Yamada')
+PRODUCT_WORDS = ('Lamp', 'Chair', 'Table', 'Tent', 'Grill', 'Bike', 'Rug', 'Kettle', 'Bench',
+                 'Hammock', 'Shelf', 'Heater', 'Cooler', 'Planter', 'Desk', 'Umbrella')
+TAG_WORDS = ('Sports', 'Kitchen', 'Garden', 'Summer', 'Winter', 'Sale', 'New', 'Eco', 'Kids',
+             'Premium', 'Camping', 'Office', 'Gift', 'Outlet', 'Bestseller')
+# Share of each status by order age: recent orders are mostly still open.
+STATUS_BY_AGE = (
+    (2, (('Pending', 0.6), ('Out for delivery', 0.3), ('Delivered', 0.1))),
+    (7, (('Pending', 0.15), ('Out for delivery', 0.25), ('Delivered', 0.6))),
+    (None, (('Pending', 0.01), ('Out for delivery', 0.01), ('Delivered', 0.98))),
+)
+SEED_PASSWORD = 'seed-password'
+SEED_UNTIL = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class Seeder:
+    def __init__(self, seed=0, days=730, until=SEED_UNTIL, batch_size=10000, use_copy=True, log=None):
+        self.rng = random.Random(seed)
+        self.now = until
+        self.days = days
+        self.batch_size = batch_size
+        self.use_copy = use_copy
+        self.log = log or (lambda message: None)
+
+    def created_at(self, recent_bias=1.5):
+        """A timestamp in the window, skewed towards its end (the business grows)."""
+        age = self.days * self.rng.random() ** recent_bias
+        return self.now - datetime.timedelta(days=age)
+
+    def status_for(self, created):
+        age = (self.now - created).days
+        for limit, weights in STATUS_BY_AGE:
+            if limit is None or age < limit:
+                statuses, shares = zip(*weights)
+                return self.rng.choices(statuses, shares)[0]
+
+    def insert(self, model, objs):
+        """
+        Write ``objs`` through the cursor instead of ``bulk_create()``: that
+        skips ``pre_save()``, so the ``date_created`` values we generated
+        survive ``auto_now_add``, and so are the model's signals and bulk hooks.
+        """
+        connection = connections[router.db_for_write(model)]
+        fields = [field for field in model._meta.concrete_fields if field is not model._meta.auto_field]
+        rows = [[field.get_db_prep_save(getattr(obj, field.attname), connection) for field in fields]
+                for obj in objs]
+        table = connection.ops.quote_name(model._meta.db_table)
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+        with connection.cursor() as cursor:
+            if self.use_copy and connection.vendor == 'postgresql':
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows([r'\N' if value is None else value for value in row] for row in rows)
+                buffer.seek(0)
+                cursor.copy_expert("COPY %s (%s) FROM STDIN WITH (FORMAT csv, NULL '\\N')" % (table, columns),
+                                   buffer)
+            else:
+                placeholders = ', '.join(['%s'] * len(fields))
+                cursor.executemany('INSERT INTO %s (%s) VALUES (%s)' % (table, columns, placeholders), rows)
+
+    def _batches(self, rows):
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, self.batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def tags(self, count):
+        names = ['%s %d' % (TAG_WORDS[i % len(TAG_WORDS)], i // len(TAG_WORDS)) if i >= len(TAG_WORDS)
+                 else TAG_WORDS[i] for i in range(count)]
+        Tag.objects.bulk_create(Tag(name=name) for name in names)
+        return list(Tag.objects.order_by('-id').values_list('id', flat=True)[:count])
+
+    def products(self, count, tag_ids):
+        first = Product.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+        def rows():
+            for i in range(count):
+                yield Product(name='%s %d' % (self.rng.choice(PRODUCT_WORDS), i),
+                              price=round(self.rng.lognormvariate(3.5, 0.9), 2),
+                              category=self.rng.choice(Product.CATEGORY)[0],
+                              description='Synthetic product %d' % i,
+                              date_created=self.created_at(recent_bias=1))
+
+        for batch in self._batches(rows()):
+            self.insert(Product, batch)
+        product_ids = list(Product.objects.filter(id__gt=first).values_list('id', flat=True))
+        if tag_ids:
+            through = Product.tags.through
+            links = ((product_id, tag_id) for product_id in product_ids
+                     for tag_id in self.rng.sample(tag_ids, min(len(tag_ids), self.rng.randint(1, 3))))
+            for batch in self._batches(through(product_id=p, tag_id=t) for p, t in links):
+                through.objects.bulk_create(batch)
+        return product_ids
+
+    def customers(self, count):
+        first = Customer.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+        def rows():
+            for i in range(count):
+                name = '%s %s' % (self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES))
+                yield Customer(name=name, phone='06-%08d' % self.rng.randrange(10 ** 8),
+                               email='customer%d@example.com' % (first + i + 1),
+                               date_created=self.created_at())
+
+        for batch in self._batches(rows()):
+            self.insert(Customer, batch)
+        return list(Customer.objects.filter(id__gt=first).values_list('id', flat=True))
+
+    def users(self, count, customer_ids):
+        """Customer accounts for the first ``count`` customers, one shared password hash."""
+        password = make_password(SEED_PASSWORD)
+        group, _ = Group.objects.get_or_create(name='customer')
+        first = User.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        for batch in self._batches(User(username='seed%d' % (first + i + 1), password=password,
+                                        email='seed%d@example.com' % (first + i + 1))
+                                   for i in range(count)):
+            User.objects.bulk_create(batch)
+        user_ids = list(User.objects.filter(id__gt=first).values_list('id', flat=True))
+        through = User.groups.through
+        for batch in self._batches(through(user_id=user_id, group_id=group.id) for user_id in user_ids):
+            through.objects.bulk_create(batch)
+        Customer.objects.bulk_update([Customer(pk=customer_id, user_id=user_id)
+                                      for customer_id, user_id in zip(customer_ids, user_ids)],
+                                     ['user'], batch_size=self.batch_size)
+        return user_ids
+
+    def order_rows(self, count, customer_ids, product_ids, skew=1.1):
+        """
+        ``(customer_id, product_id, status, date_created)`` tuples. Customers
+        follow a Zipf-like distribution, so a few have thousands of orders
+        and most have a handful.
+        """
+        customer_ids = list(customer_ids)
+        self.rng.shuffle(customer_ids)
+        cumulative = list(itertools.accumulate(1 / (rank ** skew) for rank in range(1, len(customer_ids) + 1)))
+        total = cumulative[-1]
+        for _ in range(count):
+            customer_id = customer_ids[bisect.bisect_left(cumulative, self.rng.random() * total)]
+            created = self.created_at()
+            yield customer_id, self.rng.choice(product_ids), self.status_for(created), created
+
+    def orders(self, count, customer_ids, product_ids):
+        # The raw insert skips OrderQuerySet's per-batch bookkeeping;
+        # reconcile_derived() catches everything up at the end.
+        done = 0
+        for batch in self._batches(self.order_rows(count, customer_ids, product_ids)):
+            self.insert(Order, [Order(customer_id=c, product_id=p, status=s, date_created=d)
+                                for c, p, s, d in batch])
+            done += len(batch)
+            self.log('  %d orders' % done)
+
+    def run(self, customers=1000, products=100, orders=10000, tags=15, users=0):
+        with transaction.atomic():
+            self.log('Seeding %d tags, %d products, %d customers' % (tags, products, customers))
+            tag_ids = self.tags(tags) if tags else []
+            product_ids = self.products(products, tag_ids)
+            customer_ids = self.customers(customers)
+            if users:
+                self.log('Seeding %d users' % users)
+                self.users(users, customer_ids)
+            if orders:
+                self.log('Seeding %d orders' % orders)
+                self.orders(orders, customer_ids, product_ids)
+            self.log('Reconciling derived tables')
+            reconcile_derived()
+
+
+def reconcile_derived():
+    """Bring every table kept current by signals back in line after a bulk load."""
+    counters.reconcile()
+    rollups.rebuild()
+    stats.reconcile()
+    Product.objects.refresh_tag_names()
+    search.update_vectors(Customer.objects.all())
+    search.update_vectors(Product.objects.all())
+    for name in ('order', 'customer', 'product', 'roles'):
+        bump_version(name)
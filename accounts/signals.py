@@ -0,0 +1,30 @@
+import threading
+from contextlib import contextmanager
+
+from django.dispatch import Signal
+
+# Sent with ``removed`` and ``added`` lists of order states (dicts keyed by
+# ``ORDER_TRACKED_FIELDS``). An update is reported as removing the old state
+# and adding the new one, so receivers only have to handle two cases.
+orders_changed = Signal()
+
+# Sent by ``Customer.objects.bulk_create`` with the ``customer_ids`` it
+# inserted, as bulk inserts skip ``post_save``.
+customers_created = Signal()
+
+_local = threading.local()
+
+
+@contextmanager
+def bulk_operation():
+    """Silence per-instance handlers while a queryset reports the batch itself."""
+    depth = getattr(_local, 'bulk_depth', 0)
+    _local.bulk_depth = depth + 1
+    try:
+        yield
+    finally:
+        _local.bulk_depth = depth
+
+
+def in_bulk_operation():
+    return getattr(_local, 'bulk_depth', 0) > 0
@@ -0,0 +1,133 @@
+"""
+Per-customer order totals in ``CustomerStats``, so detail pages and
+customer listings read them instead of aggregating ``order_set``.
+
+``orders_changed`` is applied with ``F()`` increments. ``total_spent`` uses
+the product's current price, so a price change or a deleted product
+reconciles the customers involved. ``reconcile()`` repairs any other drift.
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DateTimeField, F, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Customer, CustomerStats, Order, Product
+from .routers import primary
+
+COUNT_FIELDS = ('order_count', 'delivered', 'pending', 'total_spent')
+STATUS_FIELDS = {'Delivered': 'delivered', 'Pending': 'pending'}
+
+
+def customer_deltas(removed, added):
+    """``{customer_id: {field: delta, 'last_order_at': newest added}}`` and the customers that lost orders."""
+    product_ids = {row['product_id'] for rows in (removed, added) for row in rows if row['product_id']}
+    prices = (dict(primary(Product.objects.filter(pk__in=product_ids)).values_list('pk', 'price'))
+              if product_ids else {})
+    deltas = defaultdict(lambda: defaultdict(int))
+    shrunk = set()
+    for rows, sign in ((removed, -1), (added, 1)):
+        for row in rows:
+            customer_id = row['customer_id']
+            if customer_id is None:
+                continue
+            delta = deltas[customer_id]
+            delta['order_count'] += sign
+            if row['status'] in STATUS_FIELDS:
+                delta[STATUS_FIELDS[row['status']]] += sign
+            delta['total_spent'] += sign * (prices.get(row['product_id']) or 0)
+            if sign > 0:
+                delta['last_order_at'] = max(filter(None, (delta.get('last_order_at'), row['date_created'])))
+            else:
+                shrunk.add(customer_id)
+    return deltas, shrunk
+
+
+def latest_order_date():
+    return Subquery(Order._base_manager.filter(customer=OuterRef('customer'))
+                    .order_by('-date_created').values('date_created')[:1])
+
+
+@transaction.atomic
+def apply(deltas, shrunk=()):
+    missing = []
+    for customer_id, delta in deltas.items():
+        updates = {field: F(field) + delta[field] for field in COUNT_FIELDS if delta.get(field)}
+        last = delta.get('last_order_at')
+        if last is not None:
+            last = Value(last, output_field=DateTimeField())
+            updates['last_order_at'] = Greatest(Coalesce('last_order_at', last), last)
+        if updates and not CustomerStats.objects.filter(customer_id=customer_id).update(**updates):
+            missing.append(customer_id)
+    if shrunk:
+        CustomerStats.objects.filter(customer_id__in=shrunk).update(last_order_at=latest_order_date())
+    if missing:
+        reconcile(missing)
+
+
+def actual_stats(customer_ids):
+    stats = {customer_id: (0, 0, 0, 0.0, None) for customer_id in customer_ids}
+    rows = (Order._base_manager.filter(customer_id__in=customer_ids).order_by().values('customer_id')
+            .annotate(order_count=Count('id'),
+                      delivered=Count('id', filter=Q(status='Delivered')),
+                      pending=Count('id', filter=Q(status='Pending')),
+                      total_spent=Coalesce(Sum('product__price'), 0.0),
+                      last_order_at=Max('date_created'))
+            .values_list('customer_id', 'order_count', 'delivered', 'pending', 'total_spent', 'last_order_at'))
+    for customer_id, *values in rows:
+        stats[customer_id] = tuple(values)
+    return stats
+
+
+def _stored(stats):
+    return (stats.order_count, stats.delivered, stats.pending, stats.total_spent, stats.last_order_at)
+
+
+def _same(stored, actual):
+    return stored[:3] == actual[:3] and round(stored[3], 2) == round(actual[3], 2) and stored[4] == actual[4]
+
+
+def reconcile(customer_ids=None, batch_size=5000):
+    """
+    Recompute the stats of ``customer_ids`` (default: every customer) and
+    return ``{customer_id: (stored, actual)}`` for the ones that drifted.
+    """
+    if customer_ids is None:
+        customer_ids = Customer.objects.order_by('pk').values_list('pk', flat=True).iterator()
+    drift = {}
+    batch = []
+    for customer_id in customer_ids:
+        batch.append(customer_id)
+        if len(batch) == batch_size:
+            drift.update(_reconcile_batch(batch))
+            batch = []
+    if batch:
+        drift.update(_reconcile_batch(batch))
+    return drift
+
+
+@transaction.atomic
+def _reconcile_batch(customer_ids):
+    existing = set(Customer.objects.filter(pk__in=customer_ids).values_list('pk', flat=True))
+    stored = {stats.customer_id: stats for stats in
+              CustomerStats.objects.select_for_update().filter(customer_id__in=existing)}
+    drift, changed, created = {}, [], []
+    for customer_id, actual in actual_stats(existing).items():
+        stats = stored.get(customer_id)
+        if stats is not None and _same(_stored(stats), actual):
+            continue
+        drift[customer_id] = (_stored(stats) if stats else None, actual)
+        if stats is None:
+            stats = CustomerStats(customer_id=customer_id)
+            created.append(stats)
+        else:
+            changed.append(stats)
+        stats.order_count, stats.delivered, stats.pending, stats.total_spent, stats.last_order_at = actual
+    CustomerStats.objects.bulk_update(changed, COUNT_FIELDS + ('last_order_at',), batch_size=1000)
+    try:
+        with transaction.atomic():
+            CustomerStats.objects.bulk_create(created, batch_size=1000)
+    except IntegrityError:
+        # Created concurrently by an order event in the meantime; try again next run.
+        pass
+    return drift
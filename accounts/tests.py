@@ -1,3 +1,1254 @@
-from django.test import TestCase
+import csv
+import datetime
+import gzip
+import io
+import ipaddress
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import AnonymousUser, Group, User
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections
+from django.db.models import F
+from django.db.models.query import QuerySet, ValuesListIterable
+from django.http import Http404, HttpResponse
+from django.template import TemplateSyntaxError, engines
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from djangoTutorial.db.backends.sqlite3.base import DatabaseWrapper as SQLitePooledWrapper
+from djangoTutorial.db.pool import ConnectionPool, PoolTimeout, all_stats
+from djangoTutorial.staticfiles import accepted_encodings
+from . import (auth, benchmark, checks, counters, metrics, pagination, roles, rollups, routers, search, stats,
+               seeding, throttle, urls)
+from .apps import preload_templates
+from .bulk import OrderImportError, import_orders
+from .caching import bump_version, cache_view, get_versions, is_shared
+from .export import EXPORT_CHUNK_SIZE
+from .models import (Customer, CustomerOrderRollup, CustomerStats, Order, OrderRollup, Product, RollupDirtyDay,
+                     Tag)
+from .seeding import Seeder
+from .signals import customers_created
+
+SEQUENTIAL_SCAN = {
+    'postgresql': re.compile(r'Seq Scan on (accounts_\w+)'),
+    'sqlite': re.compile(r'SCAN (?:TABLE )?(accounts_\w+)(?! USING)(?:\s|$)'),
+}
+
+
+class QueryPlanTests(TestCase):
+    """
+    The main (paginated) query of each listing view must be answered from an
+    index once the tables are large enough for the planner to care.
+    """
+    customers = 500
+    products = 200
+    orders = 20000
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('staff', password='secret')
+        cls.user.groups.add(Group.objects.get_or_create(name='admin')[0])
+        Customer.objects.bulk_create(Customer(name='Customer %d' % i) for i in range(cls.customers))
+        Product.objects.bulk_create(Product(name='Product %d' % i, category='Indoor')
+                                    for i in range(cls.products))
+        customer_ids = list(Customer.objects.values_list('id', flat=True))
+        product_ids = list(Product.objects.values_list('id', flat=True))
+        statuses = [status for status, _ in Order.STATUS]
+        Order.objects.bulk_create(
+            (Order(customer_id=customer_ids[i % len(customer_ids)],
+                   product_id=product_ids[i % len(product_ids)],
+                   status=statuses[i % len(statuses)])
+             for i in range(cls.orders)),
+            batch_size=2000,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.customer = Customer.objects.order_by('id').first()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def assertNoSequentialScans(self, url):
+        pattern = SEQUENTIAL_SCAN.get(connection.vendor)
+        if pattern is None:
+            self.skipTest('No plan check for %s' % connection.vendor)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        explain = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or ' LIMIT ' not in sql:
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(explain + sql)
+                plan = '\n'.join(str(row[-1]) for row in cursor.fetchall())
+            scan = pattern.search(plan)
+            if scan:
+                self.fail('%s scans %s sequentially:\n%s\n%s' % (url, scan.group(1), sql, plan))
+
+    def test_dashboard(self):
+        self.assertNoSequentialScans(reverse('accounts:home'))
+
+    def test_products(self):
+        self.assertNoSequentialScans(reverse('accounts:products'))
+
+    def test_customers_by_stats(self):
+        for sort in ('orders', 'spent'):
+            self.assertNoSequentialScans(reverse('accounts:customers') + '?sort=' + sort)
+
+    def test_customer_orders(self):
+        self.assertNoSequentialScans(reverse('accounts:orders', args=[self.customer.id]))
+
+    def test_customer_orders_filtered(self):
+        url = reverse('accounts:orders', args=[self.customer.id])
+        self.assertNoSequentialScans(url + '?status=Pending&start_date=2020-01-01')
+
+
+class QueryCountTests(TestCase):
+    """Pages that list orders run the same number of queries however many orders there are."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('staff', password='secret', is_staff=True, is_superuser=True)
+        cls.user.groups.add(Group.objects.get_or_create(name='admin')[0])
+        cls.customer = Customer.objects.create(name='Anna Smith')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.addCleanup(cache.clear)
+
+    def add_orders(self, count):
+        # A new customer and product per order, so a lookup per row would show.
+        for i in range(count):
+            customer = Customer.objects.create(name='Customer %d' % i)
+            product = Product.objects.create(name='Product %d' % i, category='Indoor')
+            Order.objects.create(customer=customer, product=product, status='Pending')
+            Order.objects.create(customer=self.customer, product=product, status='Delivered')
+
+    def count_queries(self, url):
+        # Cold caches, so cached fragments cannot hide a query per row.
+        cache.clear()
+        with override_settings(ACCOUNTS_VIEW_CACHE=False), CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+
+    def assertFlatQueries(self, url):
+        self.add_orders(2)
+        self.client.get(url)
+        few = self.count_queries(url)
+        self.add_orders(10)
+        self.client.get(url)
+        cache.clear()
+        with override_settings(ACCOUNTS_VIEW_CACHE=False), self.assertNumQueries(few):
+            self.client.get(url)
+
+    def test_dashboard(self):
+        self.assertFlatQueries(reverse('accounts:home'))
+
+    def test_customer_detail(self):
+        self.assertFlatQueries(reverse('accounts:orders', args=[self.customer.id]))
+
+    def test_admin_order_changelist(self):
+        self.assertFlatQueries(reverse('admin:accounts_order_changelist'))
+
+
+class ProductTagTests(TestCase):
+    def setUp(self):
+        self.lamp = Product.objects.create(name='Lamp', category='Indoor')
+        self.tent = Product.objects.create(name='Tent', category='Out door')
+        self.sale, self.summer = Tag.objects.create(name='Sale'), Tag.objects.create(name='Summer')
+
+    def tag_names(self, product):
+        return Product.objects.get(pk=product.pk).tag_names
+
+    def test_tag_names_follow_m2m_changes(self):
+        self.lamp.tags.add(self.summer, self.sale)
+        self.sale.product_set.add(self.tent)
+        self.assertEqual(self.tag_names(self.lamp), ['Sale', 'Summer'])
+        self.assertEqual(self.tag_names(self.tent), ['Sale'])
+        self.sale.product_set.clear()
+        self.assertEqual(self.tag_names(self.lamp), ['Summer'])
+        self.assertEqual(self.tag_names(self.tent), [])
+
+    def test_tag_names_follow_rename_and_delete(self):
+        self.lamp.tags.add(self.sale, self.summer)
+        self.sale.name = 'Outlet'
+        self.sale.save()
+        self.assertEqual(self.tag_names(self.lamp), ['Outlet', 'Summer'])
+        self.summer.delete()
+        self.assertEqual(self.tag_names(self.lamp), ['Outlet'])
+
+    def test_with_tag_and_facets(self):
+        self.lamp.tags.add(self.sale, self.summer)
+        self.tent.tags.add(self.sale)
+        self.assertEqual(list(Product.objects.with_tag('Summer')), [self.lamp])
+        self.assertEqual(Product.objects.tag_facets(), [('Sale', 2), ('Summer', 1)])
+
+    def test_product_list_prefetches_tags(self):
+        user = User.objects.create_user('staff', password='secret')
+        user.groups.add(Group.objects.get_or_create(name='admin')[0])
+        self.client.force_login(user)
+        self.lamp.tags.add(self.sale, self.summer)
+        self.tent.tags.add(self.sale)
+        with override_settings(ACCOUNTS_VIEW_CACHE=False), CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('accounts:products'))
+        through = Product.tags.through._meta.db_table
+        self.assertEqual(sum(through in query['sql'] for query in queries.captured_queries), 2)
+
+    def test_product_list_caches_facets_until_products_change(self):
+        user = User.objects.create_user('staff', password='secret')
+        self.client.force_login(user)
+        self.lamp.tags.add(self.sale)
+        url = reverse('accounts:products')
+        with override_settings(ACCOUNTS_VIEW_CACHE=False):
+            self.assertEqual(self.client.get(url).context['tag_facets'], [('Sale', 1)])
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url + '?tag=Sale')
+            self.assertFalse(any('COUNT(' in query['sql'] for query in queries.captured_queries))
+            self.tent.tags.add(self.sale, self.summer)
+            self.assertEqual(self.client.get(url).context['tag_facets'], [('Sale', 2), ('Summer', 1)])
+
+
+class SearchTests(TestCase):
+    """Runs against whichever backend is configured; SQLite exercises the fallback."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('staff', password='secret')
+        cls.anna = Customer.objects.create(name='Anna Smith', email='anna@example.com', phone='0612345678')
+        cls.joanna = Customer.objects.create(name='Joanna Brown', email='jb@example.com')
+        cls.lamp = Product.objects.create(name='Garden lamp', description='Solar powered')
+        cls.lamp.tags.add(Tag.objects.create(name='Outdoor'))
+        cls.order = Order.objects.create(customer=cls.joanna, product=cls.lamp, status='Pending')
+
+    def test_ranks_name_matches(self):
+        self.assertEqual(search.search(Customer, 'anna')[0], self.anna)
+        self.assertEqual(list(search.search(Customer, 'ann smi')), [self.anna])
+        self.assertEqual(list(search.search(Customer, '0612345678')), [self.anna])
+
+    def test_products_match_description_and_tags(self):
+        self.assertEqual(list(search.search(Product, 'solar')), [self.lamp])
+        self.assertEqual(list(search.search(Product, 'outdoor')), [self.lamp])
+        self.assertEqual(list(search.search(Product, '  ')), [])
+
+    def test_orders_of_matching_customers_and_products(self):
+        self.assertEqual(list(search.search_orders('joanna')), [self.order])
+        self.assertEqual(list(search.search_orders('lamp')), [self.order])
+        self.assertEqual(list(search.search_orders('smith')), [])
+
+    def test_vectors_follow_saves(self):
+        if not search.indexed(Customer):
+            self.skipTest('Search vectors are PostgreSQL only')
+        self.anna.name = 'Anna de Vries'
+        self.anna.save()
+        self.assertEqual(list(search.search(Customer, 'vries')), [self.anna])
+
+    def test_autocomplete(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('accounts:search_autocomplete'), {'q': 'Gar'})
+        self.assertEqual([(result['type'], result['label']) for result in response.json()['results']],
+                         [('product', 'Garden lamp')])
+        self.assertEqual(search.autocomplete(Customer, 'a'), [])
+
+    def test_search_page(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('accounts:search'), {'q': 'lamp'})
+        self.assertContains(response, 'Garden lamp')
+        self.assertContains(response, 'Joanna Brown')
+
+
+class AutocompleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('staff', password='secret')
+        cls.user.groups.add(Group.objects.get_or_create(name='admin')[0])
+        cls.customer = Customer.objects.create(name='Anna Smith')
+        Product.objects.bulk_create(Product(name='Lamp %02d' % i, category='Indoor') for i in range(30))
+        Product.objects.create(name='Tent', category='Out door')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_forms_render_only_selected_options(self):
+        order = Order.objects.create(customer=self.customer, product=Product.objects.get(name='Tent'))
+        with override_settings(ACCOUNTS_VIEW_CACHE=False):
+            response = self.client.get(reverse('accounts:order_update', args=[order.pk]))
+            self.assertContains(response, 'data-autocomplete-url')
+            self.assertContains(response, '>Tent</option>')
+            self.assertNotContains(response, 'Lamp 00')
+            response = self.client.get(reverse('accounts:order_create', args=[self.customer.pk]))
+            self.assertNotContains(response, 'Lamp 00')
+            response = self.client.get(reverse('accounts:orders', args=[self.customer.pk]), {'product': 'x'})
+            self.assertEqual(response.status_code, 200)
+
+    def test_pages_through_prefix_matches(self):
+        url = reverse('accounts:autocomplete', args=['product'])
+        first = self.client.get(url, {'q': 'lamp'}).json()
+        self.assertEqual([result['text'] for result in first['results']], ['Lamp %02d' % i for i in range(20)])
+        second = self.client.get(url, {'q': 'lamp', 'cursor': first['next']}).json()
+        self.assertEqual([result['text'] for result in second['results']], ['Lamp %02d' % i for i in range(20, 30)])
+        self.assertIsNone(second['next'])
+
+    def test_users_are_admin_only(self):
+        url = reverse('accounts:autocomplete', args=['user'])
+        self.assertEqual(self.client.get(url, {'q': 'sta'}).json()['results'][0]['text'], 'staff')
+        self.client.force_login(User.objects.create_user('someone', password='secret'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(reverse('accounts:autocomplete', args=['group'])).status_code, 404)
+
+
+class OrderFormSetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('staff', password='secret')
+        cls.customer = Customer.objects.create(name='Anna Smith')
+        cls.lamp = Product.objects.create(name='Lamp', category='Indoor')
+        cls.tent = Product.objects.create(name='Tent', category='Out door')
+        Order.objects.bulk_create(Order(customer=cls.customer, product=cls.lamp, status='Delivered')
+                                  for _ in range(200))
+        cls.url = reverse('accounts:order_create', args=[cls.customer.pk])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def management(self, total, initial):
+        return {'order_set-TOTAL_FORMS': str(total), 'order_set-INITIAL_FORMS': str(initial),
+                'order_set-MIN_NUM_FORMS': '0', 'order_set-MAX_NUM_FORMS': '1000'}
+
+    def test_renders_new_rows_and_optional_recent_window(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['formset'].initial_form_count(), 0)
+        self.assertEqual(len(response.context['formset'].forms), 10)
+        response = self.client.get(self.url, {'recent': '5'})
+        recent = list(self.customer.order_set.order_by('-date_created', '-id')[:5])
+        self.assertEqual([form.instance for form in response.context['formset'].initial_forms], recent)
+        response = self.client.get(self.url, {'recent': '5000'})
+        self.assertEqual(response.context['formset'].initial_form_count(), 50)
+
+    def test_post_loads_only_submitted_rows(self):
+        edited, untouched = self.customer.order_set.order_by('id')[:2]
+        data = self.management(3, 2)
+        data.update({'order_set-0-id': edited.pk, 'order_set-0-product': self.tent.pk,
+                     'order_set-0-status': 'Delivered', 'order_set-0-customer': self.customer.pk,
+                     'order_set-1-id': untouched.pk, 'order_set-1-product': self.lamp.pk,
+                     'order_set-1-status': 'Delivered', 'order_set-1-customer': self.customer.pk,
+                     'order_set-2-product': self.tent.pk, 'order_set-2-status': 'Pending'})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Order.objects.get(pk=edited.pk).product, self.tent)
+        self.assertEqual(self.customer.order_set.count(), 201)
+        order_reads = [query['sql'] for query in queries.captured_queries
+                       if query['sql'].startswith('SELECT') and 'FROM "accounts_order"' in query['sql']]
+        self.assertTrue(all(' IN (' in sql or 'LIMIT' in sql for sql in order_reads), order_reads)
+
+
+class OrderExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('staff', password='secret')
+        cls.customer = Customer.objects.create(name='Anna Smith')
+        cls.lamp = Product.objects.create(name='Lamp', category='Indoor')
+        cls.tent = Product.objects.create(name='Tent, large', category='Out door')
+        cls.pending = Order.objects.create(customer=cls.customer, product=cls.lamp, status='Pending')
+        cls.delivered = Order.objects.create(customer=cls.customer, product=cls.tent, status='Delivered')
+        Order.objects.filter(pk=cls.pending.pk).update(date_created=timezone.now() - datetime.timedelta(days=10))
+        Order.objects.create(customer=Customer.objects.create(name='Bram Bos'), product=cls.lamp, status='Pending')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.url = reverse('accounts:order_export', args=[self.customer.pk])
+
+    def body(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="orders-%d.csv"' % self.customer.pk)
+        rows = list(csv.reader(io.StringIO(self.body(response))))
+        self.assertEqual(rows[0], ['id', 'product', 'category', 'status', 'date_created'])
+        self.assertEqual([row[:4] for row in rows[1:]],
+                         [[str(self.delivered.pk), 'Tent, large', 'Out door', 'Delivered'],
+                          [str(self.pending.pk), 'Lamp', 'Indoor', 'Pending']])
+
+    def test_ndjson(self):
+        response = self.client.get(self.url, {'format': 'ndjson'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['Content-Disposition'],
+                         'attachment; filename="orders-%d.ndjson"' % self.customer.pk)
+        rows = [json.loads(line) for line in self.body(response).splitlines()]
+        self.assertEqual([(row['id'], row['product'], row['status']) for row in rows],
+                         [(self.delivered.pk, 'Tent, large', 'Delivered'), (self.pending.pk, 'Lamp', 'Pending')])
+        self.assertRegex(rows[0]['date_created'], r'^\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d')
+
+    def test_filters(self):
+        def ids(params):
+            body = self.body(self.client.get(self.url, dict(params, format='ndjson')))
+            return [json.loads(line)['id'] for line in body.splitlines()]
+
+        self.assertEqual(ids({'status': 'Pending'}), [self.pending.pk])
+        self.assertEqual(ids({'product': self.tent.pk}), [self.delivered.pk])
+        start = (timezone.now() - datetime.timedelta(days=2)).date().isoformat()
+        self.assertEqual(ids({'start_date': start}), [self.delivered.pk])
+        self.assertEqual(ids({'end_date': start}), [self.pending.pk])
+
+    def test_streams_tuples_from_an_iterator(self):
+        iterator = QuerySet.iterator
+        with mock.patch.object(QuerySet, 'iterator', autospec=True, side_effect=iterator) as spy, \
+                mock.patch.object(Order, 'from_db') as from_db:
+            response = self.client.get(self.url)
+            self.body(response)
+        queryset = spy.call_args[0][0]
+        self.assertIsInstance(queryset._iterable_class(queryset), ValuesListIterable)
+        self.assertEqual(spy.call_args[1], {'chunk_size': EXPORT_CHUNK_SIZE})
+        from_db.assert_not_called()
+
+
+class OrderRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(name='Anna Smith')
+        cls.lamp = Product.objects.create(name='Lamp', category='Indoor')
+        cls.tent = Product.objects.create(name='Tent', category='Out door')
+
+    def buckets(self):
+        return {(rollup.status, rollup.category): rollup.count
+                for rollup in OrderRollup.objects.all() if rollup.count}
+
+    def customer_buckets(self):
+        return {rollup.customer_id: rollup.count for rollup in CustomerOrderRollup.objects.all() if rollup.count}
+
+    def assertMatchesRebuild(self):
+        incremental = self.buckets(), self.customer_buckets()
+        rollups.rebuild()
+        self.assertEqual(incremental, (self.buckets(), self.customer_buckets()))
+
+    def test_follows_order_events(self):
+        order = Order.objects.create(customer=self.customer, product=self.lamp, status='Pending')
+        Order.objects.bulk_create([Order(customer=self.customer, product=self.tent, status='Pending')
+                                   for _ in range(3)])
+        order.status = 'Delivered'
+        order.save()
+        Order.objects.filter(product=self.tent).update(status='Out for delivery')
+        Order.objects.filter(product=self.tent)[:1].get().delete()
+        self.assertEqual(self.buckets(), {('Delivered', 'Indoor'): 1, ('Out for delivery', 'Out door'): 2})
+        self.assertMatchesRebuild()
+
+    def test_customer_counts_follow_order_events(self):
+        bram = Customer.objects.create(name='Bram Bos')
+        Order.objects.bulk_create([Order(customer=self.customer, product=self.lamp, status='Pending')
+                                   for _ in range(3)])
+        order = Order.objects.create(customer=bram, product=self.tent, status='Pending')
+        Order.objects.filter(pk=order.pk).update(customer=self.customer)
+        Order.objects.create(customer=bram, product=self.tent, status='Pending')
+        Order.objects.filter(product=self.lamp)[:1].get().delete()
+        self.assertEqual(self.customer_buckets(), {self.customer.pk: 3, bram.pk: 1})
+        self.assertMatchesRebuild()
+        bram.delete()
+        self.assertEqual(self.customer_buckets(), {self.customer.pk: 3})
+
+    def test_category_change_marks_days_dirty(self):
+        Order.objects.create(customer=self.customer, product=self.lamp, status='Pending')
+        self.lamp.category = 'Out door'
+        self.lamp.save()
+        self.assertEqual(self.buckets(), {('Pending', 'Indoor'): 1})
+        self.assertEqual(rollups.refresh(), [timezone.localdate()])
+        self.assertEqual(self.buckets(), {('Pending', 'Out door'): 1})
+        self.assertFalse(RollupDirtyDay.objects.exists())
+
+    def test_report_data(self):
+        Order.objects.create(customer=self.customer, product=self.lamp, status='Pending')
+        Order.objects.create(customer=self.customer, product=self.tent, status='Pending')
+        user = User.objects.create_user('staff', password='secret')
+        user.groups.add(Group.objects.get_or_create(name='admin')[0])
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(reverse('accounts:report_data'), {'period': 'week', 'by': 'category'}).json()
+        self.assertFalse([query for query in queries.captured_queries if '"accounts_order"' in query['sql']])
+        week = timezone.localdate() - datetime.timedelta(days=timezone.localdate().weekday())
+        self.assertEqual(data['series'], [{'period': week.isoformat(), 'category': 'Indoor', 'count': 1},
+                                          {'period': week.isoformat(), 'category': 'Out door', 'count': 1}])
+
+        bram = Customer.objects.create(name='Bram Bos')
+        Order.objects.create(customer=bram, product=self.lamp, status='Pending')
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(reverse('accounts:report_data'), {'period': 'week', 'by': 'customer'}).json()
+        self.assertFalse([query for query in queries.captured_queries if '"accounts_order"' in query['sql']])
+        self.assertEqual(data['series'], [
+            {'period': week.isoformat(), 'customer': self.customer.pk, 'name': 'Anna Smith', 'count': 2},
+            {'period': week.isoformat(), 'customer': bram.pk, 'name': 'Bram Bos', 'count': 1},
+        ])
+        data = self.client.get(reverse('accounts:report_data'), {'customer': bram.pk}).json()
+        self.assertEqual(data['by'], 'customer')
+        self.assertEqual([row['count'] for row in data['series']], [1])
+        response = self.client.get(reverse('accounts:report_data'), {'customer': bram.pk, 'status': 'Pending'})
+        self.assertEqual(response.status_code, 400)
+        self.assertContains(self.client.get(reverse('accounts:reports'), {'by': 'customer'}), 'Bram Bos')
+        response = self.client.get(reverse('accounts:report_data'), {'start': '2021-02-01', 'end': '2021-01-01'})
+        self.assertEqual(response.status_code, 400)
+        self.assertContains(self.client.get(reverse('accounts:reports')), 'report-series')
+
+    def test_reports_link_only_for_admins(self):
+        reports = reverse('accounts:reports')
+        for role, shown in (('admin', True), ('customer', False)):
+            user = User.objects.create_user(role, password='secret')
+            user.groups.add(Group.objects.get_or_create(name=role)[0])
+            self.client.force_login(user)
+            with override_settings(ACCOUNTS_VIEW_CACHE=False):
+                response = self.client.get(reverse('accounts:products'))
+            self.assertEqual('href="%s"' % reports in response.content.decode(), shown, role)
+
+
+class PaginationTests(TestCase):
+    @skipUnless(connection.vendor == 'postgresql', 'Row estimates come from the PostgreSQL planner')
+    def test_estimate_count_reads_the_plan(self):
+        Customer.objects.create(name='Anna')
+        self.assertIsInstance(pagination.estimate_count(Customer.objects.all()), int)
+
+    def test_estimate_count_is_postgresql_only(self):
+        if connection.vendor == 'postgresql':
+            self.skipTest('Estimates are available on PostgreSQL')
+        self.assertIsNone(pagination.estimate_count(Customer.objects.all()))
+
+    def test_tampered_cursors_are_not_found(self):
+        ordering = ('-date_created', '-id')
+        for values in (['2021-13-45T00:00:00', 1], ['2021-01-01T00:00:00', 'x'], [None, 1], [[1], 1], [1]):
+            cursor = pagination.encode_cursor(values)
+            with self.assertRaises(Http404):
+                pagination.keyset_page(Order.objects.all(), ordering, cursor=cursor)
+        customers = Customer.objects.annotate(order_count=F('stats__order_count'))
+        with self.assertRaises(Http404):
+            pagination.keyset_page(customers, ('-order_count', '-id'), cursor=pagination.encode_cursor(['many', 1]))
+
+
+class OrderImportTests(TestCase):
+    def test_invalid_rows_are_reported(self):
+        customer = Customer.objects.create(name='Anna')
+        product = Product.objects.create(name='Lamp', price=10)
+        rows = enumerate([{'product': product.pk, 'status': ['Pending']}, {'product': product.pk, 'status': 'Lost'},
+                          {'product': product.pk, 'status': 'Pending'}], start=1)
+        with self.assertRaises(OrderImportError) as raised:
+            import_orders(customer, rows)
+        self.assertEqual([error['line'] for error in raised.exception.errors], [1, 2])
+        self.assertFalse(Order.objects.exists())
+
+
+class CacheVersionTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_evicted_versions_do_not_go_back(self):
+        user = User(pk=1)
+        first = roles._cache_key(user.pk)
+        roles.invalidate_all()
+        second = roles._cache_key(user.pk)
+        cache.delete('accounts:version:roles')
+        roles.invalidate_all()
+        self.assertEqual(len({first, second, roles._cache_key(user.pk)}), 3)
+        self.assertGreater(roles.version(), int(second.split(':')[2]))
+
+
+class CacheCheckTests(SimpleTestCase):
+    def test_missing_memcached_client_is_reported(self):
+        try:
+            import pylibmc  # noqa: F401
+        except ImportError:
+            pass
+        else:
+            self.skipTest('pylibmc is installed')
+        backend = {'BACKEND': 'django.core.cache.backends.memcached.PyLibMCCache', 'LOCATION': '127.0.0.1:11211'}
+        with override_settings(CACHES={'default': backend}):
+            self.assertEqual([error.id for error in checks.check_cache_clients(None)], ['accounts.E001'])
+            self.assertEqual(checks.check_shared_cache(None), [])
+        self.assertEqual(checks.check_cache_clients(None), [])
+
+
+class PreloadTemplatesTests(SimpleTestCase):
+    def test_broken_template_is_logged(self):
+        engine = mock.Mock(dirs=[], get_template=mock.Mock(side_effect=TemplateSyntaxError('broken')))
+        with override_settings(ACCOUNTS_PRELOAD_TEMPLATES=True), \
+                mock.patch.object(engines, 'all', return_value=[engine]), \
+                self.assertLogs('accounts.apps', 'ERROR') as logs:
+            preload_templates()
+        self.assertIn('Could not preload template accounts/dashboard.html', '\n'.join(logs.output))
+
+
+class CacheViewTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User(pk=1, username='anna')
+        self.user._cached_roles = ('admin',)
+        self.calls = 0
+
+    def request(self, method='get', user=None):
+        request = getattr(RequestFactory(), method)('/orders/')
+        request.user = user or self.user
+        return request
+
+    def view(self, timeout=60, inner=None):
+        @cache_view(depends_on=('order',), timeout=timeout)
+        def view(request):
+            self.calls += 1
+            if inner:
+                inner()
+            return HttpResponse('render %d' % self.calls)
+
+        return view
+
+    def test_version_bump_is_a_miss(self):
+        view = self.view()
+        self.assertEqual(view(self.request()).content, b'render 1')
+        self.assertEqual(view(self.request()).content, b'render 1')
+        bump_version('order')
+        self.assertEqual(view(self.request()).content, b'render 2')
+
+    def test_stale_entry_is_served_while_one_request_rebuilds(self):
+        stale = []
+        view = self.view(inner=lambda: stale.append(view(self.request()).content) if self.calls == 2 else None)
+        now = time.time()
+        with mock.patch('accounts.caching.time.time', return_value=now):
+            view(self.request())
+        with mock.patch('accounts.caching.time.time', return_value=now + 61):
+            self.assertEqual(view(self.request()).content, b'render 2')
+        # The request that came in during the rebuild got the old copy, without rendering.
+        self.assertEqual(stale, [b'render 1'])
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(view(self.request()).content, b'render 2')
+
+    def test_unsafe_and_anonymous_requests_bypass_the_cache(self):
+        view = self.view()
+        view(self.request())
+        self.assertEqual(view(self.request('post')).content, b'render 2')
+        self.assertEqual(view(self.request(user=AnonymousUser())).content, b'render 3')
+        self.assertEqual(view(self.request(user=AnonymousUser())).content, b'render 4')
+        self.assertEqual(view(self.request()).content, b'render 1')
+
+
+class BenchmarkTests(TestCase):
+    def test_bench_user_cannot_log_in_with_a_password(self):
+        user = benchmark.bench_user()
+        self.assertFalse(user.has_usable_password())
+        self.assertTrue(user.groups.filter(name='admin').exists())
+        self.assertNotEqual(benchmark.bench_user().username, user.username)
+
+    def test_existing_database_needs_an_existing_user(self):
+        with self.assertRaisesMessage(CommandError, '--use-existing needs --user'):
+            call_command('bench', use_existing=True)
+        with self.assertRaisesMessage(CommandError, '--url needs --use-existing'):
+            call_command('bench', url='http://127.0.0.1:8000')
+        self.assertFalse(User.objects.filter(username__startswith='bench-').exists())
+
+    def test_login_redirects(self):
+        login = reverse('accounts:login')
+        self.assertTrue(benchmark.is_login_redirect(302, 'http://testserver%s?next=/' % login))
+        self.assertFalse(benchmark.is_login_redirect(200, login))
+        self.assertFalse(benchmark.is_login_redirect(302, '/customers/'))
+
+    def test_routes_cover_every_accounts_url(self):
+        customer = Customer.objects.create(name='Anna Smith')
+        product = Product.objects.create(name='Lamp', category='Indoor', price=10)
+        Order.objects.create(customer=customer, product=product, status='Pending')
+        routes = benchmark.accounts_routes()
+        self.assertEqual({route.name for route in routes},
+                         {pattern.name for pattern in urls.urlpatterns})
+
+        user = benchmark.bench_user()
+        for route in routes:
+            client = Client()
+            if not route.anonymous:
+                client.force_login(user)
+            with self.subTest(route=route.name):
+                self.assertLess(benchmark._request(client, route, user).status_code, 400)
+
+
+class SeederTests(TestCase):
+    def test_keeps_generated_dates_without_touching_auto_now_add(self):
+        versions = get_versions(['order', 'customer', 'product'])
+        Seeder(seed=1, days=30).run(customers=20, products=5, orders=50, tags=3)
+        self.assertEqual(Order.objects.count(), 50)
+        self.assertGreater(Order.objects.filter(date_created__lt=timezone.now() - datetime.timedelta(days=1)).count(), 0)
+        self.assertEqual(Customer.objects.filter(stats__isnull=False).count(), 20)
+        self.assertTrue(all(new != old for new, old in zip(get_versions(['order', 'customer', 'product']), versions)))
+        self.assertTrue(Order._meta.get_field('date_created').auto_now_add)
+        customer = Customer.objects.create(name='Fresh', date_created=timezone.now() - datetime.timedelta(days=9))
+        self.assertGreater(customer.date_created, timezone.now() - datetime.timedelta(minutes=1))
+
+    def test_same_seed_gives_the_same_rows(self):
+        def seeded():
+            Seeder(seed=3, days=30).run(customers=10, products=4, orders=30, tags=2)
+            rows = (list(Customer.objects.order_by('id').values_list('name', 'email', 'date_created')),
+                    list(Product.objects.order_by('id').values_list('name', 'price', 'tag_names', 'date_created')),
+                    list(Order.objects.order_by('id').values_list('customer__name', 'status', 'date_created')))
+            Order.objects.all().delete()
+            Customer.objects.all().delete()
+            Product.objects.all().delete()
+            return rows
+
+        first = seeded()
+        self.assertEqual(seeded(), first)
+        self.assertLessEqual(max(date for _, _, date in first[2]), seeding.SEED_UNTIL)
+
+    def test_links_users_to_customers_in_one_update(self):
+        with CaptureQueriesContext(connection) as queries:
+            Seeder(seed=1, days=30).run(customers=6, products=1, orders=0, tags=0, users=4)
+        updates = [query['sql'] for query in queries.captured_queries
+                   if query['sql'].startswith('UPDATE "accounts_customer" SET "user_id"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(Customer.objects.filter(user__username__startswith='seed').count(), 4)
+
+
+class CounterTests(TestCase):
+    def test_bulk_created_customers_and_orders_without_status(self):
+        customers = Customer.objects.bulk_create([Customer(name='Anna'), Customer(name='Bram')])
+        Order.objects.create(customer=Customer.objects.first())
+        totals = counters.get_counts()
+        self.assertEqual(totals[counters.CUSTOMERS_TOTAL], 2)
+        self.assertEqual(totals[counters.ORDERS_TOTAL], 1)
+        self.assertNotIn('orders:None', totals)
+        self.assertEqual(CustomerStats.objects.count(), len(customers))
+        self.assertEqual(counters.reconcile(), {})
+        with self.assertRaises(ValueError):
+            counters.order_status_key(None)
+
+    def test_bulk_create_ignoring_conflicts_counts_only_inserted_rows(self):
+        anna = Customer.objects.create(name='Anna')
+        Customer.objects.bulk_create([Customer(pk=anna.pk, name='Anna again'), Customer(name='Bram')],
+                                     ignore_conflicts=True)
+        self.assertEqual(counters.get_counts()[counters.CUSTOMERS_TOTAL], 2)
+        self.assertEqual(counters.reconcile(), {})
+
+    def test_bulk_created_customers_are_searchable_and_invalidate_views(self):
+        customers = [Customer.objects.create(name='Anna'), Customer.objects.create(name='Bram')]
+        version = get_versions(['customer'])
+        with mock.patch.object(search, 'update_vectors') as update_vectors:
+            customers_created.send(sender=Customer, customer_ids=[customer.pk for customer in customers])
+        self.assertEqual(sorted(update_vectors.call_args[0][0].values_list('pk', flat=True)),
+                         sorted(customer.pk for customer in customers))
+        self.assertNotEqual(get_versions(['customer']), version)
+
+
+class CustomerStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.anna = Customer.objects.create(name='Anna Smith')
+        cls.bram = Customer.objects.create(name='Bram Bos')
+        cls.lamp = Product.objects.create(name='Lamp', category='Indoor', price=10)
+        cls.tent = Product.objects.create(name='Tent', category='Out door', price=100)
+
+    def stats(self, customer):
+        stats = CustomerStats.objects.get(customer=customer)
+        return stats.order_count, stats.delivered, stats.pending, round(stats.total_spent, 2)
+
+    def test_follows_order_events_and_matches_reconcile(self):
+        first = Order.objects.create(customer=self.anna, product=self.lamp, status='Pending')
+        Order.objects.bulk_create([Order(customer=self.anna, product=self.tent, status='Pending'),
+                                   Order(customer=self.bram, product=self.tent, status='Delivered')])
+        first.status = 'Delivered'
+        first.save()
+        Order.objects.filter(customer=self.anna, product=self.tent).update(customer=self.bram)
+        self.assertEqual(self.stats(self.anna), (1, 1, 0, 10))
+        self.assertEqual(self.stats(self.bram), (2, 1, 1, 200))
+        last = Order.objects.filter(customer=self.bram).order_by('-date_created', '-id').first()
+        self.assertEqual(CustomerStats.objects.get(customer=self.bram).last_order_at, last.date_created)
+        last.delete()
+        self.assertEqual(stats.reconcile(), {})
+
+    def test_price_change_and_drift_are_repaired(self):
+        Order.objects.create(customer=self.anna, product=self.tent, status='Pending')
+        self.tent.price = 50
+        self.tent.save()
+        self.assertEqual(self.stats(self.anna), (1, 0, 1, 50))
+        CustomerStats.objects.filter(customer=self.anna).update(order_count=7)
+        self.assertEqual(list(stats.reconcile()), [self.anna.pk])
+        self.assertEqual(self.stats(self.anna), (1, 0, 1, 50))
+
+    def test_listings_show_and_sort_by_stats(self):
+        Order.objects.create(customer=self.bram, product=self.tent, status='Pending')
+        user = User.objects.create_user('staff', password='secret')
+        user.groups.add(Group.objects.get_or_create(name='admin')[0])
+        self.client.force_login(user)
+        with override_settings(ACCOUNTS_VIEW_CACHE=False):
+            response = self.client.get(reverse('accounts:customers'), {'sort': 'spent'})
+            self.assertEqual([customer.name for customer in response.context['customer_page']],
+                             ['Bram Bos', 'Anna Smith'])
+            response = self.client.get(reverse('accounts:orders', args=[self.bram.pk]))
+        self.assertContains(response, 'Total Orders: 1')
+
+    def test_sorting_by_stats_never_sees_null_values(self):
+        # NULLs sort first on PostgreSQL and cannot go into a cursor.
+        Order.objects.create(customer=self.bram, product=self.tent, status='Pending')
+        CustomerStats.objects.filter(customer=self.anna).delete()
+        user = User.objects.create_user('staff', password='secret')
+        user.groups.add(Group.objects.get_or_create(name='admin')[0])
+        self.client.force_login(user)
+        with override_settings(ACCOUNTS_VIEW_CACHE=False):
+            for sort in ('orders', 'spent'):
+                page = self.client.get(reverse('accounts:customers'), {'sort': sort}).context['customer_page']
+                self.assertEqual([(customer.name, customer.order_count) for customer in page], [('Bram Bos', 1)])
+
+
+class ThrottleTests(TestCase):
+    """Runs against the default locmem cache."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user('anna', password='secret')
+
+    def setUp(self):
+        cache.clear()
+        throttle.reset()
+        self.addCleanup(throttle.reset)
+        self.addCleanup(cache.clear)
+
+    def login(self, username, password='wrong', ip='10.0.0.1'):
+        return self.client.post(reverse('accounts:login'), {'username': username, 'password': password},
+                                REMOTE_ADDR=ip)
+
+    def test_username_bucket_spans_addresses(self):
+        capacity = throttle.USERNAME_RATE[0]
+        for i in range(capacity):
+            self.assertEqual(self.login('Anna', ip='10.0.1.%d' % i).status_code, 200)
+        response = self.login('anna', ip='10.0.2.1')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(throttle.stats(), {('login', 'served'): capacity, ('login', 'rejected_username'): 1})
+
+    def test_ip_bucket(self):
+        for i in range(throttle.IP_RATE[0]):
+            self.assertEqual(self.login('user%d' % i).status_code, 200)
+        self.assertEqual(self.login('someone').status_code, 429)
+        self.assertEqual(self.login('someone', ip='10.0.0.2').status_code, 200)
+
+    def test_shared_cache_limits_other_workers(self):
+        for i in range(throttle.USERNAME_RATE[0]):
+            self.login('anna', ip='10.0.1.%d' % i)
+        throttle.reset()
+        self.assertEqual(self.login('anna').status_code, 429)
+
+    def test_successful_login_resets_username_bucket(self):
+        for _ in range(throttle.USERNAME_RATE[0] - 1):
+            self.login('anna')
+        self.assertEqual(self.login('anna', 'secret').status_code, 302)
+        self.client.logout()
+        self.assertEqual(self.login('anna').status_code, 200)
+
+    def test_busy_hash_slots(self):
+        slots = [throttle._hash_slots.acquire() for _ in range(throttle.HASH_CONCURRENCY)]
+        self.addCleanup(lambda: [throttle._hash_slots.release() for _ in slots])
+        with mock.patch.object(throttle, 'HASH_WAIT', 0.01):
+            response = self.client.post(reverse('accounts:register'), {'username': 'bram'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(throttle.stats(), {('register', 'rejected_busy'): 1})
+
+    def test_client_ip_trusts_only_configured_proxies(self):
+        request = RequestFactory().post('/', REMOTE_ADDR='10.0.0.5', HTTP_X_FORWARDED_FOR='1.2.3.4, 5.6.7.8, 10.0.0.9')
+        self.assertEqual(throttle.client_ip(request), '10.0.0.5')
+        with mock.patch.object(throttle, 'TRUSTED_PROXIES', [ipaddress.ip_network('10.0.0.0/24')]):
+            self.assertEqual(throttle.client_ip(request), '5.6.7.8')
+            request.META['HTTP_X_FORWARDED_FOR'] = '10.0.0.7'
+            self.assertEqual(throttle.client_ip(request), '10.0.0.7')
+
+    def test_forwarded_for_behind_a_proxy(self):
+        with mock.patch.object(throttle, 'TRUSTED_PROXIES', [ipaddress.ip_network('127.0.0.1')]):
+            for i in range(throttle.IP_RATE[0]):
+                self.client.post(reverse('accounts:login'), {'username': 'user%d' % i},
+                                 REMOTE_ADDR='127.0.0.1', HTTP_X_FORWARDED_FOR='1.2.3.4')
+            response = self.client.post(reverse('accounts:login'), {'username': 'someone'},
+                                        REMOTE_ADDR='127.0.0.1', HTTP_X_FORWARDED_FOR='1.2.3.4')
+            self.assertEqual(response.status_code, 429)
+            response = self.client.post(reverse('accounts:login'), {'username': 'someone'},
+                                        REMOTE_ADDR='127.0.0.1', HTTP_X_FORWARDED_FOR='1.2.3.5')
+            self.assertEqual(response.status_code, 200)
+
+    def test_shared_bucket_is_taken_atomically(self):
+        bucket = throttle.TokenBucket('race', 5, 60)
+        taken = []
+
+        def worker():
+            try:
+                bucket._consume_shared('key', time.time())
+                taken.append(1)
+            except throttle.Throttled:
+                pass
+
+        threads = [threading.Thread(target=worker) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(taken), 5)
+
+    def test_tokens_refused_by_the_shared_cache_are_handed_back(self):
+        bucket = throttle.TokenBucket('refund', 2, 60)
+        for _ in range(2):
+            bucket.consume('key')
+        bucket.clear()
+        for _ in range(3):
+            with self.assertRaises(throttle.Throttled):
+                bucket.consume('key')
+        cache.delete(bucket._cache_key('key'))
+        bucket.consume('key')
+        bucket.consume('key')
+
+    def test_get_is_not_throttled(self):
+        for _ in range(throttle.IP_RATE[0] + 1):
+            self.assertEqual(self.client.get(reverse('accounts:login')).status_code, 200)
+
+
+def file_cache(location):
+    return {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+
+
+class CachedAuthTests(TestCase):
+    """Runs against a file based cache, which every process on the host shares."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Group.objects.create(name='admin')
+        cls.user = User.objects.create_user('anna', password='secret')
+        cls.user.groups.add(cls.admin)
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, True)
+        settings = override_settings(CACHES={'default': file_cache(self.location)},
+                                     SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client.force_login(self.user)
+
+    def tables(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, {table for query in queries for table in re.findall(r'FROM "(\w+)"', query['sql'])}
+
+    def test_warm_request_skips_session_user_and_groups(self):
+        url = reverse('accounts:reports')
+        self.client.get(url)
+        response, tables = self.tables(url)
+        self.assertContains(response, 'Reports')
+        self.assertFalse(tables & {'django_session', 'auth_user', 'auth_group', 'auth_user_groups'})
+
+    def test_password_change_ends_other_sessions(self):
+        url = reverse('accounts:reports')
+        self.client.get(url)
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('changed')
+        user.save()
+        self.assertRedirects(self.client.get(url), '%s?next=%s' % (reverse('accounts:login'), url),
+                             fetch_redirect_response=False)
+
+    def test_group_change_is_seen(self):
+        url = reverse('accounts:reports')
+        self.client.get(url)
+        self.user.groups.remove(self.admin)
+        self.assertContains(self.client.get(url), 'not authorized')
+
+    def test_snapshot_user_keeps_password(self):
+        self.client.get(reverse('accounts:reports'))
+        user = auth.from_snapshot(cache.get(auth._cache_key(self.user.pk)))
+        user.first_name = 'Anna'
+        with self.assertNumQueries(1):
+            user.save()
+        self.assertTrue(User.objects.get(pk=self.user.pk).check_password('secret'))
+
+    def test_password_change_in_one_worker_reaches_the_others(self):
+        # Two workers: separate cache clients on the same shared store.
+        first = FileBasedCache(self.location, {})
+        second = FileBasedCache(self.location, {})
+        url = reverse('accounts:reports')
+        with mock.patch.object(auth, 'cache', first), mock.patch.object(roles, 'cache', first):
+            self.assertContains(self.client.get(url), 'Reports')
+        with mock.patch.object(auth, 'cache', second), mock.patch.object(roles, 'cache', second):
+            user = User.objects.get(pk=self.user.pk)
+            user.set_password('changed')
+            user.save()
+        with mock.patch.object(auth, 'cache', first), mock.patch.object(roles, 'cache', first):
+            self.assertRedirects(self.client.get(url), '%s?next=%s' % (reverse('accounts:login'), url),
+                                 fetch_redirect_response=False)
+
+    def test_no_snapshots_in_a_process_local_cache(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertFalse(is_shared())
+            url = reverse('accounts:reports')
+            self.client.get(url)
+            self.assertIsNone(cache.get(auth._cache_key(self.user.pk)))
+            with self.settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db'):
+                self.assertEqual([warning.id for warning in checks.check_shared_cache(None)], ['accounts.W001'])
+
+
+class StaticFilesTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings = override_settings(STATIC_ROOT=root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.url = staticfiles_storage.url('main/js/autocomplete.js')
+
+    def test_hashed_url_is_immutable_and_precompressed(self):
+        self.assertRegex(self.url, r'^/static/main/js/autocomplete\.[0-9a-f]{12}\.js$')
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertFalse(response.has_header('Content-Disposition'))
+        body = gzip.decompress(b''.join(response.streaming_content))
+        self.assertIn(b'data-autocomplete-url', body)
+
+    def test_identity_and_unhashed_names(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertFalse(response.has_header('Content-Disposition'))
+        response = self.client.get('/static/main/js/autocomplete.js')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('immutable', response['Cache-Control'])
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_accepted_encodings(self):
+        self.assertEqual(accepted_encodings('br;q=1.0, gzip;q=0, *'), {'br', '*'})
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('anna', password='secret')
+        cls.staff = User.objects.create_user('bram', password='secret', is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        self.addCleanup(cache.clear)
+
+    def test_server_timing(self):
+        self.client.force_login(self.user)
+        first = self.client.get(reverse('accounts:home'))['Server-Timing']
+        self.assertRegex(first, r'db;dur=[\d.]+;desc="[1-9]\d* queries", tpl;dur=[\d.]+, '
+                                r'cache;desc="hits=0 misses=1", total;dur=[\d.]+')
+        self.assertIn('hits=1 misses=0', self.client.get(reverse('accounts:home'))['Server-Timing'])
+
+    def test_metrics_endpoint(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('accounts:home'))
+        self.client.get('/no-such-page/')
+        self.assertEqual(self.client.get(reverse('accounts:metrics')).status_code, 302)
+
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('accounts:metrics'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        body = response.content.decode()
+        self.assertIn('django_request_duration_seconds_count{view="accounts:home"} 1\n', body)
+        self.assertIn('django_request_duration_seconds_bucket{view="accounts:home",le="+Inf"} 1\n', body)
+        self.assertIn('django_responses_total{view="unmatched",status="404"} 1\n', body)
+        self.assertIn('accounts_view_cache_misses_total{view="accounts:home"} 1\n', body)
+        self.assertIn('django_responses_total{view="accounts:metrics",status="302"} 1\n', body)
+
+    def test_queries_in_other_threads_are_counted(self):
+        def query():
+            return Customer.objects.count()
+
+        def view(request):
+            # What sync_to_async() does under ASGI: run in a worker thread.
+            async_to_sync(sync_to_async(query, thread_sensitive=False))()
+            return HttpResponse()
+
+        response = metrics.MetricsMiddleware(view)(RequestFactory().get('/'))
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+
+    def test_scrapers_get_in_with_a_token_or_from_allowed_addresses(self):
+        url = reverse('accounts:metrics')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        with mock.patch.object(metrics, 'SCRAPE_TOKEN', 's3cret'):
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 302)
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+        with mock.patch.object(metrics, 'SCRAPE_NETWORKS', [ipaddress.ip_network('10.1.0.0/16')]):
+            self.assertEqual(self.client.get(url, REMOTE_ADDR='10.2.0.1').status_code, 302)
+            self.assertEqual(self.client.get(url, REMOTE_ADDR='10.1.0.1').status_code, 200)
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def make_pool(self, **kwargs):
+        pool = ConnectionPool(lambda: sqlite3.connect(':memory:', check_same_thread=False), **kwargs)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_reuses_released_connections(self):
+        pool = self.make_pool(max_size=2)
+        first = pool.checkout()
+        pool.release(first)
+        self.assertIs(pool.checkout(), first)
+        self.assertEqual(pool.stats()['created'], 1)
+        self.assertEqual(pool.stats()['checkouts'], 2)
+
+    def test_times_out_when_exhausted(self):
+        pool = self.make_pool(max_size=1, timeout=0.05)
+        pool.checkout()
+        with self.assertRaises(PoolTimeout):
+            pool.checkout()
+        self.assertEqual(pool.stats()['waits'], 1)
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+    def test_waiter_gets_released_connection(self):
+        pool = self.make_pool(max_size=1, timeout=5)
+        connection = pool.checkout()
+        threading.Timer(0.05, pool.release, [connection]).start()
+        self.assertIs(pool.checkout(), connection)
+
+    def test_pre_ping_discards_dead_connections(self):
+        pool = self.make_pool(max_size=1)
+        connection = pool.checkout()
+        pool.release(connection)
+        connection.close()
+        self.assertIsNot(pool.checkout(), connection)
+        self.assertEqual(pool.stats()['ping_failures'], 1)
+
+    def test_idle_connections_beyond_min_size_are_closed(self):
+        pool = self.make_pool(min_size=1, max_size=3, idle_timeout=0)
+        connections = [pool.checkout() for _ in range(3)]
+        for connection in connections:
+            pool.release(connection)
+        pool.checkout()
+        self.assertEqual(pool.stats()['closed'], 2)
+
+
+class PooledBackendTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.paths = [os.path.join(directory, name) for name in ('first.sqlite3', 'second.sqlite3')]
+        self.wrapper = SQLitePooledWrapper({
+            'ENGINE': 'djangoTutorial.db.backends.sqlite3', 'NAME': self.paths[0], 'POOL': {},
+            'OPTIONS': {}, 'TIME_ZONE': None, 'AUTOCOMMIT': True, 'CONN_MAX_AGE': 0,
+            'ATOMIC_REQUESTS': False, 'USER': '', 'PASSWORD': '', 'HOST': '', 'PORT': '', 'TEST': {},
+        }, 'pooled_test')
+        self.addCleanup(self.wrapper.close)
+
+    def test_usable_connection_survives_errors(self):
+        self.wrapper.ensure_connection()
+        raw = self.wrapper.connection
+        self.wrapper.errors_occurred = True
+        self.wrapper.close()
+        self.wrapper.ensure_connection()
+        self.assertIs(self.wrapper.connection, raw)
+
+    def test_new_parameters_get_a_new_pool(self):
+        self.wrapper.ensure_connection()
+        first = self.wrapper._checked_out_from
+        self.wrapper.close()
+        self.wrapper.settings_dict['NAME'] = self.paths[1]
+        self.wrapper.ensure_connection()
+        self.assertIsNot(self.wrapper._checked_out_from, first)
+        self.assertTrue(first.closed)
+        self.assertEqual(first.stats()['idle'], 0)
+        self.assertEqual(all_stats()['pooled_test']['created'], 1)
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    """Routing against SQLite stand-ins: a working replica and one that cannot be opened."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        base = {'ENGINE': 'django.db.backends.sqlite3', 'TEST': {'MIRROR': 'default'}}
+        connections.databases['replica'] = dict(base, NAME=os.path.join(cls.directory, 'replica.sqlite3'))
+        connections.databases['broken'] = dict(base, NAME=os.path.join(cls.directory, 'missing', 'db'))
+
+    @classmethod
+    def tearDownClass(cls):
+        for alias in ('replica', 'broken'):
+            connections[alias].close()
+            del connections.databases[alias]
+            delattr(connections._connections, alias)
+        shutil.rmtree(cls.directory)
+        super().tearDownClass()
+
+    def setUp(self):
+        routers.reset()
+        self.addCleanup(routers.reset)
+        self.router = routers.ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def route_request(self, request, view):
+        middleware = routers.ReplicaPinningMiddleware(lambda request: view())
+        return middleware(request)
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_reads_go_to_replica_and_writes_to_primary(self):
+        self.assertEqual(self.router.db_for_read(Order), 'replica')
+        self.assertEqual(self.router.db_for_write(Order), 'default')
+
+    @override_settings(DATABASE_REPLICAS=['broken', 'replica'])
+    def test_unavailable_replica_is_skipped(self):
+        for _ in range(5):
+            self.assertEqual(self.router.db_for_read(Order), 'replica')
+        self.assertIn('broken', routers._unavailable_until)
+
+    @override_settings(DATABASE_REPLICAS=['broken'])
+    def test_falls_back_to_primary(self):
+        self.assertEqual(self.router.db_for_read(Order), 'default')
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_write_pins_rest_of_request_and_next_requests(self):
+        reads = []
+
+        def view():
+            reads.append(self.router.db_for_read(Order))
+            self.router.db_for_write(Order)
+            reads.append(self.router.db_for_read(Order))
+            return HttpResponse()
+
+        response = self.route_request(self.factory.get('/'), view)
+        self.assertEqual(reads, ['replica', 'default'])
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+
+        request = self.factory.get('/')
+        request.COOKIES[routers.PIN_COOKIE] = '1'
+        self.route_request(request, lambda: reads.append(self.router.db_for_read(Order)) or HttpResponse())
+        self.assertEqual(reads[-1], 'default')
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_unsafe_requests_and_derived_state_read_the_primary(self):
+        reads = []
+        self.route_request(self.factory.post('/'), lambda: reads.append(self.router.db_for_read(Order)) or HttpResponse())
+        self.assertEqual(reads, ['default'])
+        with mock.patch('django.db.router.routers', [self.router]):
+            self.assertEqual(routers.primary(Order.objects.all()).db, 'default')
+            self.assertEqual(Order.objects.filter(pk=1)._on_write_db().db, 'default')
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_health_is_cached_and_query_errors_fail_over(self):
+        self.assertEqual(self.router.db_for_read(Order), 'replica')
+        with mock.patch.object(connections['replica'], 'ensure_connection') as ensure:
+            self.assertEqual(self.router.db_for_read(Order), 'replica')
+        ensure.assert_not_called()
+        connection = connections['replica']
+        routers.watch_replica_queries(None, connection)
+        self.assertEqual(connection.execute_wrappers[0], routers._watch_replica)
+        self.addCleanup(connection.execute_wrappers.remove, routers._watch_replica)
+        failing = mock.Mock(side_effect=OperationalError('gone'))
+        with self.assertRaises(OperationalError):
+            routers._watch_replica(failing, 'SELECT 1', None, False, {'connection': connection})
+        self.assertEqual(self.router.db_for_read(Order), 'default')
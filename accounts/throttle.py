@@ -0,0 +1,212 @@
+"""
+Rate and concurrency limits for the views that hash passwords
+(``login_page`` and ``Register``), so that a credential-stuffing burst is
+turned away before any PBKDF2 work is done.
+
+Each POST takes a token from a per-IP bucket and a per-username bucket,
+and then one of ``HASH_CONCURRENCY`` hashing slots of this worker process.
+Each bucket is checked in-process first, which bounds this worker exactly
+at no cost. It is then checked in the shared cache, which bounds all
+workers together; a token refused there is handed back to the in-process
+bucket. The buckets store GCRA's "theoretical arrival time", one value per
+key, which behaves like a token bucket of ``capacity`` tokens refilled at
+``capacity / period`` per second. In the cache it is an integer number of
+milliseconds moved with ``add()`` and ``incr()``, so concurrent workers
+cannot both take the last token.
+
+The per-IP bucket keys on ``client_ip()``, which only believes
+``X-Forwarded-For`` hops added by ``ACCOUNTS_TRUSTED_PROXIES``.
+"""
+import hashlib
+import ipaddress
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+# (capacity, period in seconds)
+IP_RATE = getattr(settings, 'ACCOUNTS_THROTTLE_IP_RATE', (20, 60))
+USERNAME_RATE = getattr(settings, 'ACCOUNTS_THROTTLE_USERNAME_RATE', (5, 300))
+HASH_CONCURRENCY = getattr(settings, 'ACCOUNTS_HASH_CONCURRENCY', os.cpu_count() or 2)
+# Seconds a request may wait for a hashing slot before it is turned away.
+HASH_WAIT = getattr(settings, 'ACCOUNTS_HASH_WAIT', 2)
+LOCAL_MAX_KEYS = 10000
+SHARED_ATTEMPTS = 3
+# Addresses or networks of the reverse proxies in front of the workers.
+TRUSTED_PROXIES = [ipaddress.ip_network(proxy, strict=False)
+                   for proxy in getattr(settings, 'ACCOUNTS_TRUSTED_PROXIES', ())]
+
+
+class Throttled(Exception):
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, name, capacity, period):
+        self.name = name
+        self.capacity = capacity
+        self.interval = period / capacity
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def _take(self, tat, now):
+        """The new arrival time after taking a token, or None if the bucket is empty."""
+        tat = max(tat or now, now)
+        if tat - now > (self.capacity - 1) * self.interval:
+            return None
+        return tat + self.interval
+
+    def _retry_after(self, tat, now):
+        return max(1, math.ceil(tat - now - (self.capacity - 1) * self.interval))
+
+    def _cache_key(self, key):
+        return 'accounts:throttle:%s:%s' % (self.name, hashlib.md5(key.encode()).hexdigest())
+
+    def consume(self, key):
+        now = time.time()
+        with self._lock:
+            tat = self._local.get(key)
+            taken = self._take(tat, now)
+            if taken is None:
+                raise Throttled(self.name, self._retry_after(tat, now))
+            if len(self._local) >= LOCAL_MAX_KEYS:
+                self._local = {k: v for k, v in self._local.items() if v > now}
+            self._local[key] = taken
+        try:
+            self._consume_shared(key, now)
+        except Throttled:
+            with self._lock:
+                if key in self._local:
+                    self._local[key] -= self.interval
+            raise
+
+    def _consume_shared(self, key, now):
+        cache_key = self._cache_key(key)
+        interval = max(1, round(self.interval * 1000))
+        limit = self.capacity * interval
+        now = int(now * 1000)
+        for _ in range(SHARED_ATTEMPTS):
+            # An expired key is a full bucket: the timeout ends it once its time has passed.
+            if cache.add(cache_key, now + interval, math.ceil(interval / 1000) + 1):
+                return
+            try:
+                tat = cache.incr(cache_key, interval)
+            except ValueError:
+                continue
+            if tat - now > limit:
+                cache.decr(cache_key, interval)
+                raise Throttled(self.name, self._retry_after((tat - interval) / 1000, now / 1000))
+            cache.touch(cache_key, math.ceil((tat - now) / 1000) + 1)
+            return
+
+    def reset(self, key):
+        with self._lock:
+            self._local.pop(key, None)
+        cache.delete(self._cache_key(key))
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+
+
+ip_bucket = TokenBucket('ip', *IP_RATE)
+username_bucket = TokenBucket('username', *USERNAME_RATE)
+_hash_slots = threading.BoundedSemaphore(HASH_CONCURRENCY)
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def record(endpoint, outcome):
+    with _stats_lock:
+        key = (endpoint, outcome)
+        _stats[key] = _stats.get(key, 0) + 1
+
+
+def stats():
+    """``{(endpoint, outcome): count}`` for this process; outcome is served or rejected_<reason>."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _trusted(address):
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXIES)
+
+
+def client_ip(request):
+    """
+    The peer address, or, while that is a trusted proxy, the address the
+    proxy put at the end of ``X-Forwarded-For``. Hops to the left of the
+    first untrusted one could have been written by the client.
+    """
+    address = request.META.get('REMOTE_ADDR', '')
+    forwarded = [hop.strip() for hop in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if hop.strip()]
+    while forwarded and _trusted(address):
+        address = forwarded.pop()
+    return address
+
+
+def normalize_username(username):
+    return (username or '').strip().lower()
+
+
+@contextmanager
+def hash_slot():
+    if not _hash_slots.acquire(timeout=HASH_WAIT):
+        raise Throttled('busy', 1)
+    try:
+        yield
+    finally:
+        _hash_slots.release()
+
+
+def throttle_credentials(endpoint):
+    """
+    Apply the limits above to POSTs of a view that hashes the ``username``
+    field's password. Rejected requests get a 429, or a 503 when all hashing
+    slots stay busy, with ``Retry-After``.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper_func(request, *args, **kwargs):
+            if request.method != 'POST':
+                return view_func(request, *args, **kwargs)
+            try:
+                ip_bucket.consume(client_ip(request))
+                username = normalize_username(request.POST.get('username'))
+                if username:
+                    username_bucket.consume(username)
+                with hash_slot():
+                    response = view_func(request, *args, **kwargs)
+            except Throttled as throttled:
+                record(endpoint, 'rejected_%s' % throttled.reason)
+                response = HttpResponse('Too many attempts, please try again later.',
+                                        status=503 if throttled.reason == 'busy' else 429)
+                response['Retry-After'] = str(throttled.retry_after)
+                return response
+            record(endpoint, 'served')
+            return response
+
+        return wrapper_func
+
+    return decorator
+
+
+def reset():
+    """Forget the in-process state and metrics; the shared cache is left alone."""
+    ip_bucket.clear()
+    username_bucket.clear()
+    with _stats_lock:
+        _stats.clear()
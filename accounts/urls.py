@@ -9,12 +9,21 @@ urlpatterns = [
     path('logout/', views.logout_user, name='logout'),
     path('register/', views.Register.as_view(), name='register'),
     path('products/', views.ProductList.as_view(), name='products'),
+    path('customers/', views.customer_list, name='customers'),
+    path('search/', views.search_results, name='search'),
+    path('search/autocomplete/', views.search_autocomplete, name='search_autocomplete'),
+    path('autocomplete/<slug:source>/', views.autocomplete, name='autocomplete'),
+    path('reports/', views.reports, name='reports'),
+    path('reports/data/', views.report_data, name='report_data'),
+    path('metrics/', views.metrics_page, name='metrics'),
     path('customer/create/', views.CustomerCreate.as_view(), name='customer_create'),
     path('customer/update/<int:pk>/', views.CustomerUpdate.as_view(), name='customer_update'),
     path('customer/delete/<int:pk>/', views.CustomerDelete.as_view(), name='customer_delete'),
     path('orders/<int:pk>/', views.CustomerDetail.as_view(), name='orders'),
+    path('orders/<int:pk>/export/', views.OrderExport.as_view(), name='order_export'),
     # path('orders/<int:pk>/', views.OrderList.as_view(), name='orders'),
     path('order/create/<int:pk>/', views.OrderCreate.as_view(), name='order_create'),
+    path('order/import/<int:pk>/', views.OrderImport.as_view(), name='order_import'),
     path('order/update/<int:pk>/', views.OrderUpdate.as_view(), name='order_update'),
     path('order/delete/<int:pk>/', views.OrderDelete.as_view(), name='order_delete'),
 ]
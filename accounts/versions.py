@@ -0,0 +1,37 @@
+"""
+Cache key versions: bumping a name orphans every entry whose key was built
+with its previous version.
+
+A version that is missing from the cache (never set or evicted) starts
+from the current time in microseconds rather than from 1, so it is always
+ahead of any number the name had before and old entries cannot come back.
+"""
+import time
+
+from django.core.cache import cache
+
+
+def _version_key(name):
+    return 'accounts:version:%s' % name
+
+
+def new_version():
+    return time.time_ns() // 1000
+
+
+def get_versions(names):
+    keys = [_version_key(name) for name in names]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, new_version(), None)
+            versions[key] = cache.get(key) or new_version()
+    return [versions[key] for key in keys]
+
+
+def bump_version(name):
+    """Invalidate every cached entry that depends on ``name``."""
+    try:
+        cache.incr(_version_key(name))
+    except ValueError:
+        cache.add(_version_key(name), new_version(), None)
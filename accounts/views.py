@@ -1,21 +1,49 @@
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.models import User, Group
-from django.shortcuts import render
-from django.urls import reverse_lazy
+from django.db.models import F, Q
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, render
+from django.urls import reverse, reverse_lazy
+from django.utils.http import urlencode
 from django.utils.decorators import method_decorator
-from django.views.generic import ListView, UpdateView, DeleteView, CreateView
+from django.views.generic import ListView, UpdateView, DeleteView, CreateView, View
 from django.views.generic.detail import SingleObjectMixin
 
+from . import counters, metrics, rollups, search
+from .bulk import OrderImportError, import_orders, read_rows
+from .caching import cache_view, cached_value
 from .decorators import *
+from .export import ORDER_EXPORT_HEADER, csv_lines, ndjson_lines, order_rows
 from .filters import OrderFilter
-from .forms import OrderForm, OrderFormSet, CreateUserForm, CustomerForm
+from .forms import OrderForm, OrderFormSet, CreateUserForm, CustomerForm, ReportForm
 from .models import Product, Order, Customer
+from .pagination import CursorPaginationMixin, keyset_page
+from .roles import get_role
+from .throttle import normalize_username, throttle_credentials, username_bucket
+
+CUSTOMER_PAGE_SIZE = 20
+CUSTOMER_SORTS = {
+    'newest': ('-date_created', '-id'),
+    'orders': ('-order_count', '-id'),
+    'spent': ('-total_spent', '-id'),
+}
+SEARCH_RESULTS = 20
+AUTOCOMPLETE_PAGE_SIZE = 20
+RECENT_ORDERS_MAX = 50
+# name: (queryset, field matched and shown, ordering for an empty query, roles allowed or None)
+AUTOCOMPLETE_SOURCES = {
+    'customer': (Customer.objects.only('id', 'name', 'date_created'), 'name', ('-date_created', '-id'), None),
+    'product': (Product.objects.only('id', 'name', 'date_created'), 'name', ('-date_created', '-id'), None),
+    'user': (User.objects.only('id', 'username', 'date_joined'), 'username', ('-date_joined', '-id'), ['admin']),
+}
 
 
 @unauthenticated_user
+@throttle_credentials('login')
 def login_page(request):
     if request.method == 'POST':
         username = request.POST.get('username')
@@ -23,6 +51,7 @@ def login_page(request):
         user = authenticate(request, username=username, password=password)
         if user is not None:
             login(request, user)
+            username_bucket.reset(normalize_username(username))
             return redirect('accounts:home')
         else:
             messages.error(request, 'Username or Password is not correct')
@@ -35,6 +64,7 @@ def logout_user(request):
 
 
 @method_decorator(unauthenticated_user, name='dispatch')
+@method_decorator(throttle_credentials('register'), name='dispatch')
 class Register(CreateView):
     model = User
     template_name = 'accounts/user_form.html'
@@ -56,27 +86,142 @@ class Register(CreateView):
         return super().form_valid(form)
 
 
+def customer_page(request):
+    customers = Customer.objects.select_related('stats')
+    query = request.GET.get('q', '').strip()
+    if query:
+        customers = customers.filter(Q(name__icontains=query) | Q(email__icontains=query))
+    sort = request.GET.get('sort')
+    if sort not in CUSTOMER_SORTS:
+        sort = 'newest'
+    if sort != 'newest':
+        # An inner join (every customer gets a stats row on creation) keeps the
+        # sort values non-null and walks the CustomerStats indexes.
+        customers = (customers.filter(stats__isnull=False)
+                     .annotate(order_count=F('stats__order_count'), total_spent=F('stats__total_spent')))
+    page = keyset_page(customers, CUSTOMER_SORTS[sort],
+                       cursor=request.GET.get('cursor'), size=CUSTOMER_PAGE_SIZE)
+    page.query = query
+    page.sort = sort
+    if page.has_next():
+        params = request.GET.copy()
+        params['cursor'] = page.next_cursor
+        page.next_url = '%s?%s' % (reverse('accounts:customers'), params.urlencode())
+    return page
+
+
+@login_required()
+def search_results(request):
+    query = request.GET.get('q', '').strip()
+    context = {'query': query}
+    if query:
+        context.update(customers=search.search(Customer, query)[:SEARCH_RESULTS],
+                       products=search.search(Product, query).prefetch_related('tags')[:SEARCH_RESULTS],
+                       orders=search.search_orders(query)[:SEARCH_RESULTS])
+    return render(request, 'accounts/search.html', context)
+
+
+@login_required()
+def search_autocomplete(request):
+    query = request.GET.get('q', '')
+    results = [{'type': 'customer', 'id': pk, 'label': name, 'url': reverse('accounts:orders', args=[pk])}
+               for pk, name in search.autocomplete(Customer, query)]
+    results += [{'type': 'product', 'id': pk, 'label': name,
+                 'url': '%s?%s' % (reverse('accounts:search'), urlencode({'q': name}))}
+                for pk, name in search.autocomplete(Product, query)]
+    return JsonResponse({'results': results})
+
+
+@login_required()
+def autocomplete(request, source):
+    """
+    A page of ``{id, text}`` options for ``AutocompleteSelect``. Typed text
+    matches by prefix in name order; ``next`` is a keyset cursor, never an OFFSET.
+    """
+    if source not in AUTOCOMPLETE_SOURCES:
+        raise Http404('Unknown autocomplete source')
+    queryset, field, ordering, roles = AUTOCOMPLETE_SOURCES[source]
+    if roles is not None and get_role(request.user) not in roles:
+        return JsonResponse({'error': 'You are not authorized to view this page'}, status=403)
+    query = request.GET.get('q', '').strip()
+    if query:
+        queryset = queryset.filter(**{'%s__istartswith' % field: query})
+        ordering = (field, 'id')
+    page = keyset_page(queryset, ordering, cursor=request.GET.get('cursor'), size=AUTOCOMPLETE_PAGE_SIZE)
+    return JsonResponse({'results': [{'id': obj.pk, 'text': getattr(obj, field)} for obj in page],
+                         'next': page.next_cursor})
+
+
+@login_required()
+@allowed_users(allowed_roles=['admin'])
+def reports(request):
+    form = ReportForm(request.GET)
+    series = rollups.series(**form.cleaned_data) if form.is_valid() else []
+    return render(request, 'accounts/reports.html', {'form': form, 'series': series})
+
+
+@login_required()
+@allowed_users(allowed_roles=['admin'])
+def report_data(request):
+    """The ``reports`` series as JSON, read from the rollups only."""
+    form = ReportForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    return JsonResponse({'period': form.cleaned_data['period'], 'by': form.cleaned_data['by'],
+                         'series': rollups.series(**form.cleaned_data)})
+
+
+def metrics_page(request):
+    """This worker's request, pool and throttle metrics for Prometheus to scrape."""
+    if not metrics.scraper_allowed(request):
+        return staff_member_required(_metrics_response)(request)
+    return _metrics_response(request)
+
+
+def _metrics_response(request):
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 @login_required()
+@cache_view(depends_on=('order', 'customer', 'product'))
 def home(request):
     orders = Order.objects.order_by('-date_created')
-    total_orders = orders.count()
-    delivered = orders.filter(status='Delivered').count()
-    pending = orders.filter(status='Pending').count()
-    customers = Customer.objects.all()
-    total_customers = customers.count()
+    counts = counters.get_counts()
     context = {'order_list': orders[:5],
-               'customer_list': customers,
-               'total_orders': total_orders,
-               'total_customers': total_customers,
-               'delivered': delivered,
-               'pending': pending}
+               'customer_page': customer_page(request),
+               'total_orders': counts.get(counters.ORDERS_TOTAL, 0),
+               'total_customers': counts.get(counters.CUSTOMERS_TOTAL, 0),
+               'delivered': counts.get(counters.order_status_key('Delivered'), 0),
+               'pending': counts.get(counters.order_status_key('Pending'), 0)}
     return render(request, 'accounts/dashboard.html', context)
 
 
-class ProductList(LoginRequiredMixin, ListView):
+@login_required()
+def customer_list(request):
+    page = customer_page(request)
+    response = render(request, 'accounts/customer_rows.html', {'customer_page': page})
+    if page.has_next():
+        response['X-Next-Page'] = page.next_url
+    return response
+
+
+@method_decorator(cache_view(depends_on=('product',)), name='dispatch')
+class ProductList(LoginRequiredMixin, CursorPaginationMixin, ListView):
     model = Product
     paginate_by = 5
-    queryset = model.objects.order_by('-date_created')
+    queryset = model.objects.prefetch_related('tags').order_by('-date_created')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        self.tag = self.request.GET.get('tag')
+        return queryset.with_tag(self.tag) if self.tag else queryset
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['tag'] = self.tag
+        # Counted over every product, so one cached copy serves all pages and filters.
+        context['tag_facets'] = cached_value('tag_facets', ('product',), Product.objects.tag_facets)
+        return context
 
 
 class CustomerCreate(LoginRequiredMixin, CreateView):
@@ -110,23 +255,55 @@ class OrderCreate(LoginRequiredMixin, CreateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['formset'] = OrderFormSet(instance=self.customer)
+        if 'formset' not in context:
+            context['formset'] = OrderFormSet(instance=self.customer, recent=self.recent())
         return context
 
+    def recent(self):
+        """How many existing orders to offer for editing, from ``?recent=``."""
+        try:
+            return max(0, min(int(self.request.GET.get('recent', 0)), RECENT_ORDERS_MAX))
+        except ValueError:
+            return 0
+
     def post(self, request, *args, **kwargs):
+        self.object = None
         formset = OrderFormSet(request.POST, instance=self.customer)
         if formset.is_valid():
             formset.save()
-            return self.form_valid(formset)
+            return redirect(self.get_success_url())
+        return self.render_to_response(self.get_context_data(formset=formset))
 
     def get_success_url(self):
         return reverse_lazy('accounts:orders', kwargs={'pk': self.customer.id})
 
 
-class CustomerDetail(LoginRequiredMixin, SingleObjectMixin, ListView):
+class OrderImport(LoginRequiredMixin, View):
+    """Create orders for a customer from a CSV/NDJSON/JSON body or an uploaded ``file``."""
+
+    def post(self, request, pk):
+        customer = get_object_or_404(Customer, pk=pk)
+        upload = request.FILES.get('file')
+        if upload is not None:
+            stream, content_type = upload, upload.content_type
+        else:
+            stream, content_type = request, request.content_type
+        try:
+            created = import_orders(customer, read_rows(stream, content_type))
+        except OrderImportError as error:
+            return JsonResponse({'errors': error.errors}, status=400)
+        except ValueError:
+            return JsonResponse({'errors': [{'error': 'Malformed body'}]}, status=400)
+        return JsonResponse({'created': created}, status=201)
+
+
+@method_decorator(cache_view(depends_on=('order', 'customer', 'product')), name='dispatch')
+class CustomerDetail(LoginRequiredMixin, CursorPaginationMixin, SingleObjectMixin, ListView):
     model = Customer
-    queryset = model.objects.all()
+    queryset = model.objects.select_related('stats')
+    template_name = 'accounts/customer_detail.html'
     paginate_by = 5
+    estimate_total = True
 
     def __init__(self):
         super(CustomerDetail, self).__init__()
@@ -143,6 +320,25 @@ class CustomerDetail(LoginRequiredMixin, SingleObjectMixin, ListView):
         return context
 
 
+class OrderExport(LoginRequiredMixin, View):
+    """Stream a customer's orders, filtered like ``CustomerDetail``, as CSV or NDJSON."""
+
+    def get(self, request, pk):
+        customer = get_object_or_404(Customer, pk=pk)
+        queryset = OrderFilter(request.GET,
+                               queryset=customer.order_set.order_by('-date_created', '-id')).qs
+        rows = order_rows(queryset)
+        if request.GET.get('format') == 'ndjson':
+            response = StreamingHttpResponse(ndjson_lines(rows, ORDER_EXPORT_HEADER),
+                                             content_type='application/x-ndjson')
+            extension = 'ndjson'
+        else:
+            response = StreamingHttpResponse(csv_lines(rows, ORDER_EXPORT_HEADER), content_type='text/csv')
+            extension = 'csv'
+        response['Content-Disposition'] = 'attachment; filename="orders-%d.%s"' % (customer.id, extension)
+        return response
+
+
 class OrderUpdate(LoginRequiredMixin, UpdateView):
     model = Order
     form_class = OrderForm
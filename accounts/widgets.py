@@ -0,0 +1,43 @@
+from django import forms
+from django.core.exceptions import ValidationError
+from django.forms.models import ModelChoiceIterator
+
+
+class AutocompleteSelect(forms.Select):
+    """
+    A ``<select>`` rendered with only the selected option, so its cost does
+    not grow with the table. ``autocomplete.js`` (loaded by base.html) adds a
+    search box that pages options in from ``url``; see ``views.autocomplete``.
+    """
+
+    def __init__(self, url, attrs=None):
+        super().__init__(attrs)
+        self.url = url
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs']['data-autocomplete-url'] = str(self.url)
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        choices = self.choices
+        if isinstance(choices, ModelChoiceIterator):
+            key = choices.field.to_field_name or 'pk'
+            self.choices = ModelChoiceIterator(choices.field)
+            self.choices.queryset = choices.queryset.filter(
+                **{'%s__in' % key: self._valid_keys(choices.queryset.model, key, value)})
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = choices
+
+    @staticmethod
+    def _valid_keys(model, key, values):
+        field = model._meta.pk if key == 'pk' else model._meta.get_field(key)
+        keys = []
+        for value in values:
+            try:
+                keys.append(field.to_python(value))
+            except ValidationError:
+                pass
+        return [key for key in keys if key not in (None, '')]
@@ -0,0 +1,15 @@
+from contextlib import closing
+
+from django.db.backends.postgresql import base
+
+from djangoTutorial.db.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    def reset_pooled_connection(self, connection):
+        # DISCARD ALL drops SET values, temporary tables, prepared statements and
+        # advisory locks; it cannot run inside a transaction block.
+        connection.rollback()
+        connection.autocommit = True
+        with closing(connection.cursor()) as cursor:
+            cursor.execute('DISCARD ALL')
@@ -0,0 +1,7 @@
+from django.db.backends.sqlite3 import base
+
+from djangoTutorial.db.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    """Stand-in for running the pooled setup without a PostgreSQL server."""
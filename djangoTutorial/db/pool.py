@@ -0,0 +1,230 @@
+"""
+A small thread-safe connection pool shared by the threads of one worker
+process, and a mixin that makes a Django database backend check
+connections out of it instead of opening a new one per request.
+
+Configure it per database with a ``POOL`` dict next to ``ENGINE``::
+
+    'POOL': {
+        'MIN_SIZE': 2,         # opened when the pool is created
+        'MAX_SIZE': 10,        # per worker process
+        'TIMEOUT': 10,         # seconds to wait for a free connection
+        'IDLE_TIMEOUT': 300,   # close connections idle for longer
+        'MAX_LIFETIME': 3600,  # recycle connections older than this
+        'PRE_PING': True,      # SELECT 1 before handing out an idle connection
+    }
+"""
+import os
+import threading
+import time
+from collections import deque
+from contextlib import closing
+
+from django.db import OperationalError
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+def ping(connection):
+    with closing(connection.cursor()) as cursor:
+        cursor.execute('SELECT 1')
+
+
+class ConnectionPool:
+    def __init__(self, connect, min_size=0, max_size=10, timeout=10, idle_timeout=300,
+                 max_lifetime=None, pre_ping=True):
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.pre_ping = pre_ping
+        self._idle = deque()
+        self._born = {}
+        self._size = 0
+        self._condition = threading.Condition()
+        self.counters = dict.fromkeys(
+            ('checkouts', 'waits', 'timeouts', 'errors', 'created', 'closed', 'ping_failures'), 0)
+        self.wait_seconds = 0.0
+        self.closed = False
+        for _ in range(min_size):
+            self._size += 1
+            self._release_new(self._open())
+
+    def _open(self):
+        try:
+            connection = self._connect()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self.counters['errors'] += 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._born[id(connection)] = time.monotonic()
+            self.counters['created'] += 1
+        return connection
+
+    def _release_new(self, connection):
+        self._idle.append((connection, time.monotonic()))
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._condition:
+            self._born.pop(id(connection), None)
+            self._size -= 1
+            self.counters['closed'] += 1
+            self._condition.notify()
+
+    def _expired(self, connection, now):
+        with self._condition:
+            born = self._born.get(id(connection), now)
+        return self.max_lifetime is not None and now - born > self.max_lifetime
+
+    def _take_idle(self):
+        """Pop the most recently used idle connection, dropping stale ones. Call with the lock held."""
+        now = time.monotonic()
+        stale = []
+        while len(self._idle) > self.min_size and now - self._idle[0][1] > self.idle_timeout:
+            stale.append(self._idle.popleft()[0])
+        entry = self._idle.pop() if self._idle else None
+        return entry, stale
+
+    def checkout(self):
+        deadline = time.monotonic() + self.timeout
+        waited = None
+        while True:
+            with self._condition:
+                while True:
+                    entry, stale = self._take_idle()
+                    if entry is not None or self._size < self.max_size:
+                        break
+                    if waited is None:
+                        waited = time.monotonic()
+                        self.counters['waits'] += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.counters['timeouts'] += 1
+                        raise PoolTimeout('No database connection free after %ss' % self.timeout)
+                    self._condition.wait(remaining)
+                if entry is None:
+                    self._size += 1
+                if waited is not None:
+                    self.wait_seconds += time.monotonic() - waited
+                    waited = None
+                self.counters['checkouts'] += 1
+            for connection in stale:
+                self._discard(connection)
+            if entry is None:
+                return self._open()
+            connection, _ = entry
+            if self._expired(connection, time.monotonic()):
+                self._discard(connection)
+                continue
+            if self.pre_ping:
+                try:
+                    ping(connection)
+                except Exception:
+                    with self._condition:
+                        self.counters['ping_failures'] += 1
+                    self._discard(connection)
+                    continue
+            return connection
+
+    def release(self, connection, discard=False):
+        if discard or self.closed or self._expired(connection, time.monotonic()):
+            self._discard(connection)
+            return
+        with self._condition:
+            self._release_new(connection)
+            self._condition.notify()
+
+    def close(self):
+        """Close the idle connections; ones still checked out are closed when released."""
+        with self._condition:
+            self.closed = True
+            idle, self._idle = list(self._idle), deque()
+        for connection, _ in idle:
+            self._discard(connection)
+
+    def stats(self):
+        with self._condition:
+            stats = dict(self.counters, size=self._size, idle=len(self._idle),
+                         in_use=self._size - len(self._idle), max_size=self.max_size,
+                         wait_seconds=round(self.wait_seconds, 6))
+        return stats
+
+
+def get_pool(alias, params, factory):
+    """
+    The pool for ``alias`` in this process, for connections opened with
+    ``params``; forked workers get their own. When the parameters change,
+    e.g. to the test database's name, the old pool is closed.
+    """
+    key = (alias, os.getpid())
+    entry = _pools.get(key)
+    if entry is None or entry[0] != params:
+        with _pools_lock:
+            entry = _pools.get(key)
+            if entry is None or entry[0] != params:
+                if entry is not None:
+                    entry[1].close()
+                entry = _pools[key] = (params, factory())
+    return entry[1]
+
+
+def all_stats():
+    pid = os.getpid()
+    return {alias: pool.stats() for (alias, owner), (_, pool) in list(_pools.items()) if owner == pid}
+
+
+class PooledDatabaseWrapperMixin:
+    def _pool(self, conn_params):
+        options = self.settings_dict.get('POOL', {})
+
+        def factory():
+            return ConnectionPool(
+                lambda: super(PooledDatabaseWrapperMixin, self).get_new_connection(conn_params),
+                min_size=options.get('MIN_SIZE', 0),
+                max_size=options.get('MAX_SIZE', 10),
+                timeout=options.get('TIMEOUT', 10),
+                idle_timeout=options.get('IDLE_TIMEOUT', 300),
+                max_lifetime=options.get('MAX_LIFETIME'),
+                pre_ping=options.get('PRE_PING', True),
+            )
+
+        return get_pool(self.alias, repr(sorted(conn_params.items())), factory)
+
+    def get_new_connection(self, conn_params):
+        pool = self._pool(conn_params)
+        connection = pool.checkout()
+        self._checked_out_from = pool
+        return connection
+
+    def reset_pooled_connection(self, connection):
+        """Leave no transaction or session state behind for the next checkout."""
+        connection.rollback()
+
+    def _close(self):
+        if self.connection is None:
+            return
+        try:
+            self.reset_pooled_connection(self.connection)
+            # An error such as an expected IntegrityError leaves the connection fine.
+            discard = self.errors_occurred and not self.is_usable()
+        except Exception:
+            discard = True
+        pool = getattr(self, '_checked_out_from', None)
+        if pool is None:
+            self.connection.close()
+        else:
+            pool.release(self.connection, discard=discard)
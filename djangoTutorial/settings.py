@@ -25,7 +25,7 @@ except ImportError:
     pass
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get('DJANGO_DEBUG', 'true').lower() == 'true'
 
 ALLOWED_HOSTS = []
 
@@ -45,29 +45,58 @@ INSTALLED_APPS = [
 LOGIN_URL = 'accounts:login'
 LOGIN_REDIRECT_URL = 'accounts:home'
 
+# Reverse proxies whose X-Forwarded-For entries the login throttle believes, e.g. "10.0.0.0/8,127.0.0.1".
+ACCOUNTS_TRUSTED_PROXIES = [proxy for proxy in os.environ.get('ACCOUNTS_TRUSTED_PROXIES', '').split(',') if proxy]
+
+# How Prometheus gets into /metrics/ without a staff session: a bearer token and/or source networks.
+ACCOUNTS_METRICS_TOKEN = os.environ.get('ACCOUNTS_METRICS_TOKEN', '')
+ACCOUNTS_METRICS_ALLOWED_IPS = [ip for ip in os.environ.get('ACCOUNTS_METRICS_ALLOWED_IPS', '').split(',') if ip]
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Collected, precompressed files from STATIC_ROOT, see djangoTutorial/staticfiles.py.
+    'djangoTutorial.staticfiles.StaticFilesMiddleware',
+    # Server-Timing headers and the /metrics/ histograms, see accounts/metrics.py.
+    'accounts.metrics.MetricsMiddleware',
+    'accounts.routers.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # AuthenticationMiddleware backed by a cached user snapshot, see accounts/auth.py.
+    'accounts.auth.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Read sessions from the cache and only go to the database on a miss or a write,
+# as long as the cache is shared (see CACHES below).
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 ROOT_URLCONF = 'djangoTutorial.urls'
 
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if not DEBUG:
+    # Parse each template once per process; accounts.apps preloads them at startup.
+    TEMPLATE_LOADERS = [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)]
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, timing renders for accounts.metrics.MetricsMiddleware.
+        'BACKEND': 'accounts.metrics.TimedDjangoTemplates',
+        'NAME': 'django',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'accounts.context_processors.cache_versions',
+                'accounts.context_processors.role',
             ],
         },
     },
@@ -80,7 +109,7 @@ WSGI_APPLICATION = 'djangoTutorial.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'djangoTutorial.db.backends.postgresql',
         'NAME': 'django',
         'HOST': 'localhost',
         'USER': 'postgres',
@@ -88,9 +117,57 @@ DATABASES = {
         'PORT': '5435',
         'TEST': {
             'NAME': 'test'
-        }
+        },
+        # Per worker process, see djangoTutorial/db/pool.py.
+        'POOL': {
+            'MIN_SIZE': int(os.environ.get('DB_POOL_MIN_SIZE', 1)),
+            'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'TIMEOUT': 10,
+            'IDLE_TIMEOUT': 300,
+            'MAX_LIFETIME': 3600,
+            'PRE_PING': True,
+        },
+    }
+}
+
+# Run against a local SQLite file through the same pooled backend, e.g. for tests
+# on a machine without the PostgreSQL server.
+if os.environ.get('DJANGO_DATABASE') == 'sqlite':
+    DATABASES['default'] = {
+        'ENGINE': 'djangoTutorial.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'POOL': DATABASES['default']['POOL'],
+    }
+
+# Read replicas, e.g. DB_REPLICA_HOSTS=replica1,replica2. In the SQLite mode the
+# host names are ignored and every replica opens the same file, a zero-lag stand-in.
+DATABASE_REPLICAS = []
+for index, host in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(','))):
+    alias = 'replica%d' % (index + 1)
+    if os.environ.get('DJANGO_DATABASE') == 'sqlite':
+        DATABASES[alias] = dict(DATABASES['default'])
+    else:
+        DATABASES[alias] = dict(DATABASES['default'], HOST=host)
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['accounts.routers.ReplicaRouter']
+
+# Role and user snapshots, view cache versions, throttles and sessions are shared
+# between workers through this cache, so every process has to reach the same one:
+# a memcached server at CACHE_LOCATION, through pylibmc (see requirements.txt).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.PyLibMCCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', '127.0.0.1:11211'),
     }
 }
+# The SQLite mode runs a local process with an in-process cache. That cache cannot
+# carry a logout to other processes, so sessions stay in the database and
+# accounts.auth keeps no user snapshots.
+if os.environ.get('DJANGO_DATABASE') == 'sqlite':
+    CACHES['default'] = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+    SESSION_ENGINE = 'django.contrib.sessions.backends.db'
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -131,3 +208,7 @@ MEDIA_URL = '/images/'
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
 ]
+# `manage.py collectstatic` writes content-hashed copies plus .gz (and .br with the
+# brotli package) variants here; StaticFilesMiddleware serves them.
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+STATICFILES_STORAGE = 'djangoTutorial.staticfiles.CompressedManifestStaticFilesStorage'
@@ -0,0 +1,166 @@
+"""
+Content-hashed, precompressed static files served by the application.
+
+``collectstatic`` with ``CompressedManifestStaticFilesStorage`` writes the
+usual ``name.<hash>.ext`` copies and, next to every compressible file,
+a ``.gz`` and (when the ``brotli`` package is installed) a ``.br``
+variant. ``StaticFilesMiddleware`` answers requests under ``STATIC_URL``
+from ``STATIC_ROOT``, picks the smallest variant the client accepts and
+marks hashed names as immutable for a year. Nothing is compressed per
+request.
+"""
+import gzip
+import mimetypes
+import os
+import posixpath
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.files.base import ContentFile
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils.http import http_date
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.map', '.svg', '.ico', '.json', '.txt', '.xml', '.html')
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+MUTABLE_MAX_AGE = getattr(settings, 'STATIC_MAX_AGE', 60)
+
+
+def _encoders():
+    yield 'gzip', '.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+    if brotli is not None:
+        yield 'br', '.br', lambda data: brotli.compress(data, quality=11)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    manifest_strict = False
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in list(self.hashed_files.values()):
+            if not name.endswith(COMPRESSIBLE) or not self.exists(name):
+                continue
+            with self.open(name) as original:
+                data = original.read()
+            for encoding, suffix, compress in _encoders():
+                compressed = compress(data)
+                if len(compressed) >= len(data):
+                    continue
+                if self.exists(name + suffix):
+                    self.delete(name + suffix)
+                self.save(name + suffix, ContentFile(compressed))
+
+    def stored_name(self, name):
+        # Templates still render when collectstatic has not been run, e.g. in tests.
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+
+def accepted_encodings(header):
+    """Codings named in an ``Accept-Encoding`` header without ``q=0``."""
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                if float(params[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticFile:
+    def __init__(self, path, immutable):
+        self.path = path
+        self.immutable = immutable
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        stat = os.stat(path)
+        self.last_modified = http_date(stat.st_mtime)
+        self.etag = 'W/"%x-%x"' % (int(stat.st_mtime), stat.st_size)
+        self.variants = [(encoding, path + suffix, os.path.getsize(path + suffix))
+                         for encoding, suffix in (('br', '.br'), ('gzip', '.gz'))
+                         if os.path.exists(path + suffix)]
+        self.variants.sort(key=lambda variant: variant[2])
+
+    def choose(self, accept_encoding):
+        accepted = accepted_encodings(accept_encoding)
+        for encoding, path, size in self.variants:
+            if encoding in accepted:
+                return encoding, path
+        return None, self.path
+
+    def headers(self):
+        if self.immutable:
+            cache_control = 'public, max-age=%d, immutable' % IMMUTABLE_MAX_AGE
+        else:
+            cache_control = 'public, max-age=%d' % MUTABLE_MAX_AGE
+        headers = {'Cache-Control': cache_control, 'Last-Modified': self.last_modified, 'ETag': self.etag}
+        if self.variants:
+            headers['Vary'] = 'Accept-Encoding'
+        return headers
+
+
+def scan(root, hashed_names):
+    """``{relative url path: StaticFile}`` for everything under ``root``."""
+    files = {}
+    suffixes = ('.gz', '.br')
+    for directory, _, names in os.walk(root):
+        for filename in names:
+            if filename.endswith(suffixes) and os.path.exists(os.path.join(directory, filename[:-3])):
+                continue
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, root).replace(os.sep, '/')
+            files[name] = StaticFile(path, name in hashed_names)
+    return files
+
+
+class StaticFilesMiddleware:
+    """
+    Serve collected files under ``STATIC_URL`` before the rest of the stack.
+    The index of ``STATIC_ROOT`` is built once per process, so run
+    ``collectstatic`` before starting the workers.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL or ''
+        self.files = {}
+        root = settings.STATIC_ROOT
+        if root and os.path.isdir(root) and self.prefix.startswith('/'):
+            self.files = scan(root, set(getattr(staticfiles_storage, 'hashed_files', {}).values()))
+
+    def __call__(self, request):
+        if self.files and request.path_info.startswith(self.prefix) and request.method in ('GET', 'HEAD'):
+            name = posixpath.normpath(unquote(request.path_info[len(self.prefix):])).lstrip('/')
+            static_file = self.files.get(name)
+            if static_file is not None:
+                return self.serve(request, static_file)
+        return self.get_response(request)
+
+    def serve(self, request, static_file):
+        headers = static_file.headers()
+        if request.META.get('HTTP_IF_NONE_MATCH') == static_file.etag:
+            response = HttpResponseNotModified()
+        else:
+            encoding, path = static_file.choose(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+            response = FileResponse(open(path, 'rb'), content_type=static_file.content_type)
+            # FileResponse names the file it was given, e.g. "app.js.gz"; an empty
+            # filename falls back to that too, so drop the header instead.
+            del response['Content-Disposition']
+            if encoding:
+                response['Content-Encoding'] = encoding
+        for header, value in headers.items():
+            response[header] = value
+        return response
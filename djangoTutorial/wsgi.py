@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'djangoTutorial.settings')
 
 application = get_wsgi_application()
+
+from accounts.apps import preload_templates  # noqa: E402, needs the apps loaded
+
+preload_templates()
@@ -0,0 +1,145 @@
+// Search-as-you-type for <select data-autocomplete-url> form fields and the
+// <input data-suggest-url> navbar search. Requests are debounced and options
+// arrive a page at a time, so pages never embed whole tables.
+(function () {
+    const DELAY = 250;
+
+    function debounce(fn) {
+        let timer;
+        return function () {
+            clearTimeout(timer);
+            timer = setTimeout(fn, DELAY);
+        };
+    }
+
+    function getJSON(url, params) {
+        return fetch(url + '?' + new URLSearchParams(params), {headers: {'X-Requested-With': 'XMLHttpRequest'}})
+            .then(function (response) {
+                return response.json();
+            });
+    }
+
+    function dropdown(input) {
+        const wrapper = document.createElement('div');
+        wrapper.style.position = 'relative';
+        input.insertAdjacentElement('beforebegin', wrapper);
+        wrapper.appendChild(input);
+        const list = document.createElement('div');
+        list.className = 'list-group position-absolute w-100';
+        list.style.zIndex = 1000;
+        list.hidden = true;
+        wrapper.appendChild(list);
+        input.addEventListener('blur', function () {
+            list.hidden = true;
+        });
+        return list;
+    }
+
+    function entry(tag, label, onClick) {
+        const element = document.createElement(tag);
+        element.className = 'list-group-item list-group-item-action py-1';
+        element.textContent = label;
+        // mousedown keeps the focus, so blur does not hide the list before the click lands.
+        element.addEventListener('mousedown', function (event) {
+            event.preventDefault();
+        });
+        if (onClick) {
+            element.type = 'button';
+            element.addEventListener('click', onClick);
+        }
+        return element;
+    }
+
+    function setOption(select, value, label) {
+        select.innerHTML = '';
+        select.add(new Option(label, value, true, true));
+    }
+
+    function attachSelect(select) {
+        const input = document.createElement('input');
+        input.type = 'search';
+        input.className = 'form-control form-control-sm';
+        input.placeholder = 'Type to search';
+        const selected = select.options[select.selectedIndex];
+        if (selected && selected.value) {
+            input.value = selected.text;
+        }
+        select.hidden = true;
+        select.insertAdjacentElement('afterend', input);
+        const list = dropdown(input);
+        let query = '', cursor = null, request = 0;
+
+        function choose(result) {
+            setOption(select, result.id, result.text);
+            input.value = result.text;
+            list.hidden = true;
+            select.dispatchEvent(new Event('change', {bubbles: true}));
+        }
+
+        function load(append) {
+            const current = ++request;
+            const params = {q: query};
+            if (append) {
+                params.cursor = cursor;
+            }
+            getJSON(select.dataset.autocompleteUrl, params).then(function (data) {
+                if (current !== request) {
+                    return;
+                }
+                if (!append) {
+                    list.innerHTML = '';
+                } else if (list.lastChild) {
+                    list.lastChild.remove();
+                }
+                data.results.forEach(function (result) {
+                    list.appendChild(entry('button', result.text, function () {
+                        choose(result);
+                    }));
+                });
+                cursor = data.next;
+                if (cursor) {
+                    list.appendChild(entry('button', 'More…', function () {
+                        load(true);
+                    }));
+                }
+                list.hidden = !list.children.length;
+            });
+        }
+
+        const search = debounce(function () {
+            query = input.value.trim();
+            load(false);
+        });
+        input.addEventListener('input', function () {
+            if (!input.value) {
+                setOption(select, '', '---------');
+            }
+            search();
+        });
+        input.addEventListener('focus', search);
+    }
+
+    function attachSuggest(input) {
+        const list = dropdown(input);
+        let request = 0;
+        input.setAttribute('autocomplete', 'off');
+        input.addEventListener('input', debounce(function () {
+            const current = ++request;
+            getJSON(input.dataset.suggestUrl, {q: input.value.trim()}).then(function (data) {
+                if (current !== request) {
+                    return;
+                }
+                list.innerHTML = '';
+                data.results.forEach(function (result) {
+                    const link = entry('a', result.label + ' · ' + result.type);
+                    link.href = result.url;
+                    list.appendChild(link);
+                });
+                list.hidden = !list.children.length;
+            });
+        }));
+    }
+
+    document.querySelectorAll('select[data-autocomplete-url]').forEach(attachSelect);
+    document.querySelectorAll('input[data-suggest-url]').forEach(attachSuggest);
+})();
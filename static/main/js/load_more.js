@@ -0,0 +1,20 @@
+document.addEventListener('click', function (event) {
+    const button = event.target.closest('[data-load-more]');
+    if (!button) {
+        return;
+    }
+    button.disabled = true;
+    fetch(button.dataset.url, {headers: {'X-Requested-With': 'XMLHttpRequest'}})
+        .then(function (response) {
+            const next = response.headers.get('X-Next-Page');
+            return response.text().then(function (html) {
+                document.querySelector(button.dataset.loadMore).insertAdjacentHTML('beforeend', html);
+                if (next) {
+                    button.dataset.url = next;
+                    button.disabled = false;
+                } else {
+                    button.remove();
+                }
+            });
+        });
+});